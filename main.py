@@ -10,7 +10,11 @@ import sys
 # 添加src目录到Python路径
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
+from src.core.Disk_Writer import disk_writer
+from src.core.Image_Fetcher import image_fetcher
+from src.core.YoutubeDL_Pool import ytdl_pool
 from src.ui.UI import main
+from src.utils.Html_Parser import parse_pool
 from src.utils.CScraper import scraper_manager
 from src.utils.Logger import get_logger
 
@@ -22,5 +26,9 @@ if __name__ == "__main__":
     except Exception as e:
         logger.critical(f"主程序运行时出错: {e}")
     finally:
-        # 关闭爬虫管理器，释放资源
+        # 关闭下载线程池、yt_dlp实例池、磁盘写入线程、解析进程池和爬虫管理器，释放资源
+        image_fetcher.close()
+        ytdl_pool.close()
+        disk_writer.close()
+        parse_pool.close()
         scraper_manager.close()
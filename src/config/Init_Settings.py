@@ -4,10 +4,31 @@ import os
 STVERSION: str = "1.0.1"
 SETTINGS_FILE: str = f"iwtn_settings_{STVERSION}.json"
 CACHE_FILE: str = f"iwtn_cache_{STVERSION}.json"
+QUEUE_FILE: str = f"iwtn_queue_{STVERSION}.db"
+SESSION_FILE: str = f"iwtn_session_{STVERSION}.json"
 EDGE_FILE: str = "msedge.exe"
 THEMENAME: str = "darkly"
 MYBILIURL: str = "https://space.bilibili.com/616045770"
 MAX_PAGE: int = 20
+SEARCH_PAGE_SIZE: int = 60  # 搜索结果每页的条数, 不满一页说明是最后一页
+SEARCH_CACHE_SIZE: int = 2000  # 搜索缓存最多保存的页数
+DOWNLOAD_CHUNK_SIZE: int = 64 * 1024  # 单次读取的字节数
+MIN_SEGMENT_SIZE: int = 1024 * 1024  # 每个分段至少1MB, 否则不值得多开连接
+MIN_MEDIA_SIZE: int = 100 * 1024  # 小于100KB的不可能是视频文件
+MANIFEST_FLUSH_SIZE: int = 4 * 1024 * 1024  # 每写入4MB记录一次断点
+WRITE_BUFFER_SIZE: int = 1024 * 1024  # 后台写盘缓冲区大小, 装满后一次写入
+WRITE_BUFFER_COUNT: int = 32  # 缓冲区总数, 用完时网络读取等待写盘
+# 渐进式媒体直链的扩展名, 可以绕过yt_dlp直接用HTTP下载; 清单类(m3u8/mpd)仍交给yt_dlp
+DIRECT_MEDIA_EXTENSIONS: tuple = (".mp4", ".m4v", ".webm", ".mov", ".mkv", ".flv")
+PART_SUFFIX: str = ".part"  # 未完成文件的后缀, 断点清单为 *.part.json
+GOVERNOR_LATENCY_THRESHOLD: float = 5.0  # 响应头在该秒数内到达才算健康, 才会增加并发
+GOVERNOR_DECREASE_COOLDOWN: float = 2.0  # 两次并发减半之间至少间隔的秒数
+RETRY_BASE_DELAY: float = 1.0  # 重试退避的基础秒数, 每次失败翻倍
+RETRY_MAX_DELAY: float = 60.0  # 重试退避的最大秒数
+RESOLVE_CACHE_SIZE: int = 500  # 解析缓存最多保存的条数
+RESOLVE_CACHE_MARGIN: float = 60.0  # 签名链接过期前这么多秒就不再使用
+HTTP_POOL_HOSTS: int = 20  # 连接池最多为多少个主机保留长连接
+SESSION_STRATEGY_TTL: float = 24 * 3600  # 记住某个主机需要用浏览器访问多少秒
 Miao: bool = True
 
 DEFAULT_HEADERS: dict = {
@@ -57,6 +78,33 @@ DEFAULT_SETTINGS: dict = {
     },
     "Custom_Download_Path": os.path.join(os.path.expanduser("~"), "Custom_Downloads"),
     "Max_Threads": 8,
+    "Download_Segments": 4,
+    "Image_Threads": 8,
+    "Image_Per_Host": 4,
+    "Host_Concurrency_Initial": 4,
+    "Host_Concurrency_Max": 16,
+    "Request_Retries": 2,  # 单个请求遇到临时性错误时的重试次数
+    "Task_Retry_Budget": 3,  # 下载任务失败后重新排队的最多次数
+    "Disk_Writers": 2,  # 同时写盘的线程数
+    "Fsync_On_Close": True,  # 每个文件写完时fsync一次
+    "Resolve_Threads": 2,  # 解析线程数(请求页面、驱动浏览器), 传输线程数为Max_Threads
+    "Handoff_Queue_Size": 4,  # 解析完成等待传输的任务上限
+    "Resolve_Cache_TTL": 1800,  # 解析结果缓存的秒数, 签名链接更早过期时以链接为准
+    "Chromium_Tabs": 2,  # 浏览器预热的标签页数, 也是同时进行的浏览器任务上限
+    "Chromium_Tab_Recycle": 50,  # 标签页导航多少次后关闭重开
+    "Chromium_Browser_Recycle": 300,  # 浏览器导航多少次后重启
+    "CS_Reprobe_Interval": 300,  # cloudscraper被拦截后每隔多少秒重新探测一次
+    "Search_Page_Window": 3,  # 搜索翻页时同时获取的页数
+    "Html_Parser": "auto",  # HTML解析后端: auto/lxml/html.parser, auto时优先使用已安装的lxml
+    "Parse_Processes": 0,  # 搜索结果解析进程数, 0为在当前线程解析
+    "Search_Cache_TTL": 600,  # 搜索结果缓存的秒数
+    "Xpv_Searchid_TTL": 3600,  # Xpv搜索ID缓存的秒数, 过期后重新发送搜索请求
+    # 请求频率规则, 每个主机分别计算: method/path为空表示不限, 每interval秒一次, 最多连续burst次
+    "Request_Rate_Rules": [
+        {"method": "POST", "path": "/e/search/index.php", "interval": 5.5, "burst": 1},  # Xpv搜索
+    ],
+    "Bandwidth_Limit": 0,  # 全局限速 KB/s, 0为不限
+    "Channel_Bandwidth_Limit": {},  # 各渠道限速 KB/s, 0为不限
     "Check_Cert": True
 }
 
@@ -64,3 +112,4 @@ DEFAULT_SETTINGS: dict = {
 for channel_name, config in CHANNELS_CONFIG.items():
     DEFAULT_SETTINGS[config["hostname_key"]] = config["default_hostname"]
     DEFAULT_SETTINGS[config["download_path_key"]] = config["default_download_path"]
+    DEFAULT_SETTINGS["Channel_Bandwidth_Limit"][channel_name] = 0
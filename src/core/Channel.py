@@ -1,6 +1,6 @@
 import logging
 import os
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional
 
 from ..config.Settings_Manager import sm, cm
 from ..core.Custom_Struc import *
@@ -12,8 +12,9 @@ class Channel:
     """单个渠道的封装类"""
     
     def __init__(self, name: str, hostname_key: str, download_path_key: str,
-                 search_method: Callable, download_methods: Dict[str, Callable],
-                 video_struc: type[stru_xpv_video|stru_xpv_custom|stru_hanime1_video]):
+                 search_method: Callable, resolve_methods: Dict[str, Callable],
+                 video_struc: type[stru_xpv_video|stru_xpv_custom|stru_hanime1_video],
+                 search_pages_method: Optional[Callable] = None):
         """初始化渠道
         
         Args:
@@ -21,66 +22,68 @@ class Channel:
             hostname_key: 设置中主机名的键
             download_path_key: 设置中下载路径的键
             search_method: 搜索方法
-            download_methods: 下载方法字典，键为任务类型，值为下载函数
+            resolve_methods: 解析方法字典，键为任务类型，值为把任务解析成传输任务的函数
             video_struc: 视频结构体类型
+            search_pages_method: 逐页产出搜索结果的生成器方法，没有时只能一次性获取全部结果
         """
         self.name = name
         self.hostname_key = hostname_key
         self.download_path_key = download_path_key
         self.search_method = search_method
-        self.download_methods = download_methods
+        self.resolve_methods = resolve_methods
         self.video_struc = video_struc
+        self.search_pages_method = search_pages_method
     
     def can_handle(self, task: Any) -> bool:
         """判断该渠道是否能处理给定任务"""
         return hasattr(task, 'source') and task.source == self.name
     
-    def download(self, task: Any) -> bool:
-        """下载任务
+    def resolve(self, task: Any) -> Optional[Any]:
+        """把下载任务解析成传输任务
         
         Args:
             task: 下载任务对象
         
         Returns:
-            bool: 下载是否成功
+            Optional[Transfer_Job]: 传输任务，解析失败则返回None
         """
         # 对于结构化任务，直接使用source判断
         if hasattr(task, 'source') and task.source == self.name:
-            # 根据任务类型选择下载方法
+            # 根据任务类型选择解析方法
             task_type = "default"
             if hasattr(task, 'type'):
                 task_type = task.type
             elif hasattr(task, '__class__'):
                 task_type = task.__class__.__name__.replace("stru_", "").replace("_", "")
             
-            # 尝试获取对应的下载方法
-            download_method = self.download_methods.get(task_type)
-            if not download_method:
-                # 使用默认下载方法
-                download_method = self.download_methods.get("default")
+            # 尝试获取对应的解析方法
+            resolve_method = self.resolve_methods.get(task_type)
+            if not resolve_method:
+                # 使用默认解析方法
+                resolve_method = self.resolve_methods.get("default")
             
-            if download_method:
-                logger.info(f"使用{self.name}渠道的{task_type}方法下载任务")
+            if resolve_method:
+                logger.info(f"使用{self.name}渠道的{task_type}方法解析任务")
                 # 对于自定义任务类型，传递URL而不是整个对象
                 if task_type in ["pic", "video"] and hasattr(task, 'url'):
-                    return download_method(task.url)
-                return download_method(task)
+                    return resolve_method(task.url)
+                return resolve_method(task)
             else:
-                logger.error(f"{self.name}渠道没有找到合适的下载方法，任务类型: {task_type}")
-                return False
+                logger.error(f"{self.name}渠道没有找到合适的解析方法，任务类型: {task_type}")
+                return None
         
         # 对于自定义URL任务，根据URL特征判断
         if hasattr(task, 'url'):
             hostname = sm.settings.get(self.hostname_key, DEFAULT_SETTINGS[self.hostname_key])
             if hostname in task.url:
-                # 尝试使用自定义下载方法
-                download_method = self.download_methods.get("custom")
-                if download_method:
-                    logger.info(f"使用{self.name}渠道的custom方法下载自定义URL")
-                    return download_method(task.url)
+                # 尝试使用自定义解析方法
+                resolve_method = self.resolve_methods.get("custom")
+                if resolve_method:
+                    logger.info(f"使用{self.name}渠道的custom方法解析自定义URL")
+                    return resolve_method(task.url)
         
         logger.error(f"{self.name}渠道无法处理该任务")
-        return False
+        return None
 
 class ChannelManager:
     """渠道管理器，管理所有渠道实例"""
@@ -128,52 +131,83 @@ class ChannelManager:
         """
         return list(self.channels.keys())
     
-    def download(self, task: stru_xpv_video|stru_xpv_custom|stru_hanime1_video) -> bool:
-        """下载任务，自动选择合适的渠道
+    def resolve(self, task: stru_xpv_video|stru_xpv_custom|stru_hanime1_video) -> Optional[Any]:
+        """把下载任务解析成传输任务，自动选择合适的渠道
         
         Args:
             task: 下载任务对象
         
         Returns:
-            bool: 下载是否成功
+            Optional[Transfer_Job]: 传输任务，解析失败则返回None
         """
         # 根据任务的source属性获取渠道
         if hasattr(task, 'source'):
             channel = self.get_channel(task.source)
             if channel:
                 if task.dpath: os.makedirs(task.dpath, exist_ok=True)
-                return channel.download(task)
+                return channel.resolve(task)
         
         # 对于没有source属性的任务，尝试匹配所有渠道
         for channel in self.channels.values():
             if channel.can_handle(task):
-                return channel.download(task)
+                return channel.resolve(task)
         
         logger.error(f"没有找到可以处理该任务的渠道")
-        return False
+        return None
     
-    def search(self, keyword: str, channel_name: str) -> List[Any]:
+    def iter_search(self, keyword: str, channel_name: str, force_refresh: bool = False) -> Iterator[List[Any]]:
+        """逐页搜索指定渠道的内容，每获取一页就产出一页，全部获取完后写入缓存；
+        中途出错时停止，已产出的页面保留，但不完整的结果不写入缓存
+        
+        Args:
+            keyword: 搜索关键词
+            channel_name: 渠道名称
+            force_refresh: 忽略未过期的搜索缓存
+        
+        Yields:
+            List[Any]: 每一页的搜索结果
+        """
+        channel = self.get_channel(channel_name)
+        if not channel:
+            logger.error(f"渠道 {channel_name} 不存在")
+            return
+        
+        result: list = []
+        if channel.search_pages_method:
+            try:
+                for page in channel.search_pages_method(keyword, force_refresh=force_refresh):
+                    if page:
+                        result.extend(page)
+                        yield page
+            except Exception as e:
+                logger.warning(f"从渠道 {channel_name} 搜索 {keyword} 时出错，已获取 {len(result)} 条结果，不写入缓存: {e}")
+                return
+        else:
+            result = channel.search_method(keyword, force_refresh=force_refresh)
+            if result:
+                yield result
+        
+        if result:
+            cm.set_cache(channel_name, result)
+            logger.info(f"从渠道 {channel_name} 获取到 {len(result)} 条搜索结果")
+        else:
+            logger.info(f"从渠道 {channel_name} 搜索 {keyword} 未获取到结果")
+    
+    def search(self, keyword: str, channel_name: str, force_refresh: bool = False) -> List[Any]:
         """搜索指定渠道的内容
         
         Args:
             keyword: 搜索关键词
             channel_name: 渠道名称
+            force_refresh: 忽略未过期的搜索缓存
         
         Returns:
             List[Any]: 搜索结果列表
         """
-        channel = self.get_channel(channel_name)
-        if channel:
-            result: list = channel.search_method(keyword)
-            if result:
-                cm.set_cache(channel_name, result)
-                logger.info(f"从渠道 {channel_name} 获取到 {len(result)} 条搜索结果")
-                return result
-            else:
-                logger.info(f"从渠道 {channel_name} 搜索 {keyword} 未获取到结果")
-                return []
-        logger.error(f"渠道 {channel_name} 不存在")
-        return []
+        result: list = []
+        for page in self.iter_search(keyword, channel_name, force_refresh):
+            result.extend(page)
+        return result
 
 # 创建全局渠道管理器实例
 channel_manager = ChannelManager()
@@ -3,11 +3,12 @@ import os
 import re
 from typing import Any, cast
 
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
 
 from ..config.Init_Settings import *
 from ..config.Settings_Manager import sm, cm
 from ..utils.CScraper import scraper_manager
+from ..utils.Html_Parser import has_class, parse_html
 from ..utils.Logger import get_logger
 
 logger = get_logger("Custom_Struc")
@@ -30,6 +31,16 @@ class stru_xpv_video:
 
     def get(self, key: str, default: Any = None) -> Any:
         return self.__dict__.get(key, default)
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "stru_xpv_video":
+        """从to_dict的结果还原, 不经过__init__的加工, 保证往返无损"""
+        obj = cls.__new__(cls)
+        obj.__dict__.update(data)
+        return obj
     
     def get_updatedAt_timestamp(self) -> float:
         return datetime.datetime.fromisoformat(self.updatedAt.replace("Z", "+00:00")).timestamp()
@@ -52,6 +63,15 @@ class stru_xpv_custom:
     def get(self, key: str, default: Any = None) -> Any:
         return self.__dict__.get(key, default)
 
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "stru_xpv_custom":
+        obj = cls.__new__(cls)
+        obj.__dict__.update(data)
+        return obj
+
 class stru_hanime1_video:
     def __init__(self, data: dict):
         # 频道必须
@@ -80,6 +100,15 @@ class stru_hanime1_video:
 
     def get(self, key: str, default: Any = None) -> Any:
         return self.__dict__.get(key, default)
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "stru_hanime1_video":
+        obj = cls.__new__(cls)
+        obj.__dict__.update(data)
+        return obj
     
     def _extract_date_from_filename(self, filename: str) -> str:
         """从文件名中提取YYYY-MM-DD格式的日期"""
@@ -148,37 +177,22 @@ class stru_hanime1_video:
         try:
             # 定义日期信息提取函数，减少重复代码
             def extract_date_from_chromium() -> str:
-                # 获取唯一的Chrome实例
-                main_page = scraper_manager.get_main_chromium_page()
-                
-                # 新建标签页
-                logger.info(f"新建标签页，访问: {self.url}")
-                new_tab = main_page.new_tab()
-                
-                try:
-                    # 在新标签页中访问网页
-                    new_tab.get(self.url)
-                    
+                def read_date(tab) -> str:
                     # 等待视频详情元素出现 - 使用更可靠的选择器，避免hidden类影响
                     # 选择器说明：.video-details-wrapper是包含视频详情的容器，不使用hidden-*类以提高兼容性
                     logger.info("等待元素 .video-details-wrapper 出现")
                     # 使用tag:div@@class:video-details-wrapper语法，模糊匹配class包含video-details-wrapper的div元素
                     video_details_selector = "tag:div@@class:video-details-wrapper"
-                    new_tab.wait.ele_displayed(video_details_selector, timeout=10)
+                    tab.wait.ele_displayed(video_details_selector, timeout=10)
                     
                     # 提取日期信息 - 直接在视频详情容器内查找包含日期的元素
-                    div_info = new_tab.ele(video_details_selector)
+                    div_info = tab.ele(video_details_selector)
                     div_text: str = cast(str, div_info.text)
                     return self._extract_date_from_filename(div_text)
-                finally:
-                    # 确保标签页被关闭
-                    tabs = main_page.get_tabs()
-                    if len(tabs) > 1:
-                        logger.info("关闭标签页")
-                        try:
-                            new_tab.close()
-                        except:
-                            pass
+                
+                # 通过标签页池访问网页
+                logger.info(f"使用标签页访问: {self.url}")
+                return scraper_manager.get_chromium_broker().run(self.url, read_date)
             
             # 检查cloudscraper是否已失败
             if scraper_manager.is_cs_failed():
@@ -198,7 +212,7 @@ class stru_hanime1_video:
                     if response.status_code == 403:
                         logger.warning(f"cloudscraper返回403，切换到dissionpage")
                         # 设置cloudscraper失败标志
-                        scraper_manager.set_cs_failed(True)
+                        scraper_manager.set_cs_failed(True, self.url)
                         # 使用dissionpage
                         date = extract_date_from_chromium()
                         if date:
@@ -209,7 +223,7 @@ class stru_hanime1_video:
                     else:
                         response.raise_for_status()
                         # 使用cloudscraper返回的内容解析
-                        soup = BeautifulSoup(response.text, "html.parser")
+                        soup = parse_html(response.text, SoupStrainer("div", class_=has_class("video-details-wrapper")))
                         # 使用更可靠的选择器，模糊匹配class包含video-details-wrapper的div元素
                         div_info = soup.select_one("div.video-details-wrapper")
                         if div_info:
@@ -0,0 +1,243 @@
+import logging
+import os
+import queue
+import threading
+from typing import Callable, Optional
+
+from ..config.Init_Settings import *
+from ..config.Settings_Manager import sm
+from ..utils.Logger import get_logger
+
+logger: logging.Logger = get_logger("磁盘写入")
+
+
+class Write_Handle:
+    """通过Disk_Writer异步写入的文件
+
+    同一个文件的写入始终由同一个写入线程按提交顺序完成, 写入回调执行时之前提交的数据都已写入。
+    Windows没有pwrite, 用每个文件一把锁保护seek+write
+    """
+
+    def __init__(self, writer: "Disk_Writer", path: str, mode: str, fsync: bool, worker: int):
+        self.path = path
+        self.fsync = fsync
+        self.error: Optional[BaseException] = None
+        self._writer = writer
+        self._worker = worker
+        self._file = open(path, mode)
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._pending: int = 0
+
+    def write(self, offset: int, buffer: bytearray, length: int, callback: Optional[Callable[[], None]] = None) -> None:
+        """提交写入, buffer写完后自动归还给缓冲区池
+
+        Args:
+            offset: 文件内的偏移
+            buffer: 从Disk_Writer.acquire_buffer取得的缓冲区
+            length: 要写入的字节数
+            callback: 写入完成后在写入线程中调用
+        """
+        self._check_error()
+        with self._cond:
+            self._pending += 1
+        self._writer._enqueue(self._worker, (self, offset, buffer, length, callback))
+
+    def call_after(self, callback: Callable[[], None]) -> None:
+        """在此前提交的写入全部完成后调用callback"""
+        self._check_error()
+        with self._cond:
+            self._pending += 1
+        self._writer._enqueue(self._worker, (self, 0, None, 0, callback))
+
+    def _do_write(self, offset: int, buffer: Optional[bytearray], length: int,
+                  callback: Optional[Callable[[], None]]) -> None:
+        """在写入线程中执行"""
+        try:
+            if self.error is None:
+                if buffer is not None:
+                    with self._lock:
+                        self._file.seek(offset)
+                        self._file.write(memoryview(buffer)[:length])
+                if callback is not None:
+                    callback()
+        except Exception as e:
+            logger.error(f"写入文件失败 {self.path}: {e}")
+            self.error = e
+        finally:
+            if buffer is not None:
+                self._writer.release_buffer(buffer)
+            with self._cond:
+                self._pending -= 1
+                self._cond.notify_all()
+
+    def _check_error(self) -> None:
+        if self.error is not None:
+            raise self.error
+
+    def wait(self) -> None:
+        """等待已提交的写入全部完成, 写入出错时抛出异常"""
+        with self._cond:
+            while self._pending:
+                self._cond.wait()
+        self._check_error()
+
+    def close(self) -> None:
+        """等待写入完成后关闭文件, 按文件的策略fsync一次"""
+        try:
+            with self._cond:
+                while self._pending:
+                    self._cond.wait()
+            if self.error is None:
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+        finally:
+            self._file.close()
+        self._check_error()
+
+
+class Disk_Writer:
+    """全局的后台写盘组件
+
+    网络线程把数据读进从池中取得的大缓冲区(readinto), 装满后交给少量写入线程写盘, 把大量小写入合并
+    成少量大写入, 并限制同时写盘的线程数。缓冲区用完时读取线程阻塞, 由此对网络读取形成反压
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffers: queue.Queue[bytearray] = queue.Queue()
+        self._allocated: int = 0
+        self._queues: list[queue.Queue] = []
+        self._threads: list[threading.Thread] = []
+        self._next_worker: int = 0
+
+    def _start(self) -> None:
+        """延迟创建写入线程"""
+        with self._lock:
+            if self._threads:
+                return
+            workers: int = max(1, int(sm.settings.get("Disk_Writers", DEFAULT_SETTINGS["Disk_Writers"])))
+            logger.info(f"启动 {workers} 个磁盘写入线程")
+            for index in range(workers):
+                jobs: queue.Queue = queue.Queue(maxsize=WRITE_BUFFER_COUNT)
+                thread = threading.Thread(target=self._worker, args=(jobs,), name=f"Disk_Writer_{index}", daemon=True)
+                self._queues.append(jobs)
+                self._threads.append(thread)
+                thread.start()
+
+    def _worker(self, jobs: queue.Queue) -> None:
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            handle, offset, buffer, length, callback = job
+            handle._do_write(offset, buffer, length, callback)
+
+    def _enqueue(self, worker: int, job: tuple) -> None:
+        self._queues[worker].put(job)
+
+    def acquire_buffer(self) -> bytearray:
+        """取得一个写缓冲区, 池中没有空闲缓冲区且已达上限时阻塞"""
+        try:
+            return self._buffers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._allocated < WRITE_BUFFER_COUNT:
+                self._allocated += 1
+                return bytearray(WRITE_BUFFER_SIZE)
+        return self._buffers.get()
+
+    def release_buffer(self, buffer: bytearray) -> None:
+        """归还缓冲区"""
+        self._buffers.put(buffer)
+
+    def open(self, path: str, mode: str = "wb", fsync: Optional[bool] = None) -> Write_Handle:
+        """打开文件用于后台写入
+
+        Args:
+            path: 文件路径
+            mode: 打开模式, 预分配的文件用r+b
+            fsync: 关闭时是否fsync, None时使用设置Fsync_On_Close
+        """
+        self._start()
+        if fsync is None:
+            fsync = bool(sm.settings.get("Fsync_On_Close", DEFAULT_SETTINGS["Fsync_On_Close"]))
+        with self._lock:
+            worker = self._next_worker
+            self._next_worker = (self._next_worker + 1) % len(self._queues)
+        return Write_Handle(self, path, mode, fsync, worker)
+
+    def copy_stream(self, raw, handle: Write_Handle, offset: int, length: Optional[int] = None,
+                    on_read: Optional[Callable[[int, memoryview], None]] = None,
+                    stop_event: Optional[threading.Event] = None,
+                    on_flush: Optional[Callable[[int, int], None]] = None, flush_size: int = MANIFEST_FLUSH_SIZE) -> int:
+        """把响应流读入缓冲区并提交写入
+
+        Args:
+            raw: 支持readinto的响应流(response.raw)
+            handle: 目标文件
+            offset: 写入文件的起始偏移
+            length: 最多读取的字节数, None表示读到流结束
+            on_read: 每次读到数据时调用, 参数为文件偏移和数据, 用于校验、进度和限速
+            stop_event: 置位时尽快停止
+            on_flush: 数据确实写入文件后调用, 参数为已写入区间[start, end), 每flush_size字节至少一次
+
+        Returns:
+            int: 读取并提交写入的字节数
+        """
+        written: int = 0
+        recorded: int = 0
+        while length is None or written < length:
+            if stop_event is not None and stop_event.is_set():
+                break
+            buffer = self.acquire_buffer()
+            view = memoryview(buffer)
+            cap = len(buffer) if length is None else min(len(buffer), length - written)
+            filled: int = 0
+            try:
+                while filled < cap:
+                    if stop_event is not None and stop_event.is_set():
+                        break
+                    # 每次只读一小段, 让进度、限速和中止保持灵敏
+                    size = raw.readinto(view[filled:min(cap, filled + DOWNLOAD_CHUNK_SIZE)])
+                    if not size:
+                        break
+                    if on_read is not None:
+                        on_read(offset + written + filled, view[filled:filled + size])
+                    filled += size
+            except BaseException:
+                self.release_buffer(buffer)
+                raise
+            if not filled:
+                self.release_buffer(buffer)
+                break
+
+            callback = None
+            if on_flush is not None and written + filled - recorded >= flush_size:
+                callback = lambda start=offset + recorded, end=offset + written + filled: on_flush(start, end)
+                recorded = written + filled
+            handle.write(offset + written, buffer, filled, callback)
+            written += filled
+            if filled < cap and not (stop_event is not None and stop_event.is_set()):
+                # 流已结束
+                break
+
+        if on_flush is not None and written > recorded:
+            handle.call_after(lambda start=offset + recorded, end=offset + written: on_flush(start, end))
+        return written
+
+    def close(self) -> None:
+        """写完队列中的数据后停止写入线程"""
+        with self._lock:
+            queues, threads = self._queues, self._threads
+            self._queues, self._threads = [], []
+        for jobs in queues:
+            jobs.put(None)
+        for thread in threads:
+            thread.join()
+
+
+# 创建全局磁盘写入器
+disk_writer = Disk_Writer()
@@ -3,94 +3,180 @@ import json
 import logging
 import os
 import re
-import subprocess
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, as_completed
+from typing import Any, Optional
 from urllib.parse import urljoin
 
 import cloudscraper
-from bs4 import BeautifulSoup
-import yt_dlp
+import requests
+from bs4 import BeautifulSoup, SoupStrainer
 
 from ..core.Custom_Struc import *
 from ..core.DownloadProgressTracker import DownloadProgressTracker
+from ..core.Http_Downloader import Http_Downloader, Invalid_Content_Error
+from ..core.Image_Fetcher import image_fetcher
+from ..core.YoutubeDL_Pool import ytdl_pool
 from ..config.Init_Settings import *
 from ..config.Settings_Manager import sm, cm
 from ..utils.CScraper import scraper_manager
+from ..utils.Html_Parser import parse_html
 from ..utils.Logger import get_logger
+from ..utils.Retry_Engine import Expired_Link_Error, is_link_rejected, record_failure
 
 logger: logging.Logger = get_logger("下载")
 
+# 传输任务类型
+JOB_HTTP: str = "http"  # 直链, 由Http_Downloader下载
+JOB_YTDL: str = "ytdl"  # yt_dlp已提取好的信息, 由yt_dlp下载
+JOB_IMAGES: str = "images"  # 图集的所有图片, 由Image_Fetcher下载
+JOB_DONE: str = "done"  # 文件已存在, 无需传输
+
+
+class Transfer_Job:
+    """解析阶段的产物, 传输阶段只凭它就能下载, 不需要再请求页面"""
+
+    def __init__(self, kind: str, title: str, channel_name: str, save_path: str = "", url: str = "",
+                 headers: Optional[dict] = None, ydl_opts: Optional[dict] = None, info: Optional[dict] = None,
+                 images: Optional[list[tuple[str, str]]] = None):
+        """
+        Args:
+            kind: 传输任务类型, JOB_*之一
+            title: 进度显示用的标题
+            channel_name: 所属渠道, 用于渠道限速
+            save_path: 保存路径
+            url: 媒体URL
+            headers: 请求媒体用的请求头
+            ydl_opts: yt_dlp参数
+            info: yt_dlp提取的信息
+            images: 图集的(图片URL, 保存路径)列表
+        """
+        self.kind = kind
+        self.title = title
+        self.channel_name = channel_name
+        self.save_path = save_path
+        self.url = url
+        self.headers: dict = headers or {}
+        self.ydl_opts: dict = ydl_opts or {}
+        self.info: dict = info or {}
+        self.images: list[tuple[str, str]] = images or []
+        # 来源的下载任务, 由流水线填写
+        self.task: Any = None
+        # 是否取自解析缓存
+        self.from_cache: bool = False
+
+
 class Download_Engine:
     @staticmethod
-    def xpv_download_video(video: stru_xpv_video) -> bool:
+    def _build_media_headers(base_url: str) -> dict:
+        """构造请求媒体文件用的请求头"""
+        headers = DEFAULT_HEADERS.copy()
+        headers["Referer"] = f"{base_url}/"
+        headers["Accept"] = "video/webm,video/ogg,video/*;q=0.9,application/ogg;q=0.7,audio/*;q=0.6,*/*;q=0.5"
+        headers["Accept-Language"] = "zh-CN,zh;q=0.9,en;q=0.8"
+        headers["Accept-Encoding"] = "gzip, deflate, br"
+        headers["DNT"] = "1"
+        headers["Connection"] = "keep-alive"
+        headers["Sec-Fetch-Dest"] = "video"
+        headers["Sec-Fetch-Mode"] = "no-cors"
+        headers["Sec-Fetch-Site"] = "cross-site"
+        headers["Cache-Control"] = "no-cache"
+        headers["Pragma"] = "no-cache"
+        return headers
+
+    @staticmethod
+    def _resolve_media(url: str, save_path: str, headers: dict, title: str, ydl_opts: dict,
+                       channel_name: str) -> Transfer_Job:
+        """把媒体URL解析成传输任务, 直链交给自己的HTTP下载器, 清单和需要提取器的页面先用yt_dlp提取信息
+
+        Args:
+            url: 媒体URL或页面URL
+            save_path: 保存路径
+            headers: 请求头
+            title: 进度显示用的标题
+            ydl_opts: 退回yt_dlp时使用的参数
+            channel_name: 所属渠道, 用于渠道限速
+        """
+        if os.path.exists(save_path):
+            logger.info(f"文件已存在，跳过下载: {title}")
+            return Transfer_Job(JOB_DONE, title, channel_name, save_path=save_path)
+        if Http_Downloader.is_direct_media_url(url):
+            logger.info(f"检测到直链媒体文件: {title}")
+            return Transfer_Job(JOB_HTTP, title, channel_name, save_path=save_path, url=url, headers=headers)
+        logger.info(f"使用yt_dlp解析: {title}")
+        info = ytdl_pool.extract_info(ydl_opts, url)
+        return Transfer_Job(JOB_YTDL, title, channel_name, save_path=save_path, url=url, ydl_opts=ydl_opts, info=info)
+
+    @staticmethod
+    def _hanime1_ydl_opts() -> dict:
+        """Hanime1使用的yt_dlp参数"""
+        return {
+            "quiet": True,
+            "nocheckcertificate": not sm.settings.get("Check_Cert", DEFAULT_SETTINGS["Check_Cert"]),
+            "no_warnings": True,
+            "logtostderr": True,
+        }
+
+    @staticmethod
+    def xpv_resolve_video(video: stru_xpv_video) -> Optional[Transfer_Job]:
+        """解析Xpv视频页面, 从JSON-LD中取得视频地址"""
         base_url: str = urljoin(video.url, "/").rstrip("/")
         try:
             logger.info(f"获取视频页面: {video.url}")
-            response = scraper_manager.get_cloud_scraper().get_instance().get(
+            response = scraper_manager.get_cloud_scraper().get(
                 url=video.url,
                 timeout=7, verify=sm.settings.get("Check_Cert", DEFAULT_SETTINGS["Check_Cert"])
             )
             logger.debug(f"status_code: {response.status_code}")
             response.raise_for_status()
 
-            soup: BeautifulSoup = BeautifulSoup(response.text, "html.parser")
+            # 视频地址在第一个script标签(JSON-LD)中, 只解析script标签
+            soup: BeautifulSoup = parse_html(response.text, SoupStrainer("script"))
             """旧版 不再适用
             # video标签代表视频文件
             video_tag = soup.find("video")
             if not video_tag:
                 logger.error("未找到视频文件标签")
-                return False
+                return None
             # 视频文件URL通常在src属性中
             video_file_url = video_tag.get("src")
             if not video_file_url:
                 logger.error("视频文件标签中未找到src属性")
-                return False
+                return None
             # 视频文件URL不会是相对路径 因为视频文件URL指向另一个主机名
             """
             # 在script标签中查找视频地址
             script_tag = soup.find("script")
             if not script_tag:
                 logger.error("未找到script标签")
-                return False
+                return None
             json_str: str = script_tag.string.strip() if script_tag.string else ""
             json_str = ''.join(ch for ch in json_str if ch.isprintable()).replace("\\", "")
             video_info = json.loads(json_str)
             video_file_url = video_info["contentUrl"]
             if not video_file_url:
                 logger.error("视频文件标签中未找到contentUrl属性")
-                return False
+                return None
             logger.debug(f"video_file_url: {video_file_url}")
         except cloudscraper.exceptions.CloudflareChallengeError as e:
+            record_failure(e)
             logger.error(f"视频URL返回Cloudflare挑战错误: {e}")
-            return False
+            return None
         except Exception as e:
-            logger.error(f"下载视频时发生未知错误: {e}")
-            return False
+            record_failure(e)
+            logger.error(f"解析视频时发生未知错误: {e}")
+            return None
         
         try:
             os.makedirs(video.dpath, exist_ok=True)
             save_path = os.path.join(video.dpath, f"{video.savetitle}.mp4")
 
-            headers = DEFAULT_HEADERS.copy()
-            headers["Referer"] = f"{base_url}/"
-            headers["Accept"] = "video/webm,video/ogg,video/*;q=0.9,application/ogg;q=0.7,audio/*;q=0.6,*/*;q=0.5"
-            headers["Accept-Language"] = "zh-CN,zh;q=0.9,en;q=0.8"
-            headers["Accept-Encoding"] = "gzip, deflate, br"
-            headers["Range"] = "bytes=0-"
-            headers["DNT"] = "1"
-            headers["Connection"] = "keep-alive"
-            headers["Sec-Fetch-Dest"] = "video"
-            headers["Sec-Fetch-Mode"] = "no-cors"
-            headers["Sec-Fetch-Site"] = "cross-site"
-            headers["Cache-Control"] = "no-cache"
-            headers["Pragma"] = "no-cache"
-
-            logger.info(f"开始下载视频: {video.savetitle}")
+            headers = Download_Engine._build_media_headers(base_url)
+
             logger.debug(f"headers: {headers}")
+            # outtmpl由实例池按任务覆盖, 不参与实例复用的配置
             ydl_opts: dict = {
                 "format": "bestvideo+bestaudio/best",
-                "outtmpl": save_path,
                 "nocheckcertificate": True,
                 "useragent": headers["User-Agent"],
                 "referer": headers["Referer"],
@@ -99,43 +185,44 @@ class Download_Engine:
                 "no_warnings": True,
                 "logtostderr": True,
             }
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # pyright: ignore[reportArgumentType]
-                ydl.download([video_file_url])
-            logger.info(f"视频下载完成: {video.savetitle}")
-            return True
+            return Download_Engine._resolve_media(video_file_url, save_path, headers, video.savetitle,
+                                                  ydl_opts, video.source)
         except OSError as e:
+            record_failure(e)
             logger.error(f"文件操作错误: {e}")
-            return False
+            return None
         except Exception as e:
-            logger.error(f"下载视频时发生未知错误: {e}")
-            return False
+            record_failure(e)
+            logger.error(f"解析视频时发生未知错误: {e}")
+            return None
 
     @staticmethod
-    def xpv_download_community_video(video_page_url: str) -> bool:
+    def xpv_resolve_community_video(video_page_url: str) -> Optional[Transfer_Job]:
+        """解析Xpv社区视频页面, 从video标签中取得视频直链"""
         base_url: str = urljoin(video_page_url, "/").rstrip("/")
         try:
             logger.info(f"获取视频页面: {video_page_url}")
-            response = scraper_manager.get_cloud_scraper().get_instance().get(
+            response = scraper_manager.get_cloud_scraper().get(
                 url=video_page_url,
                 timeout=5, verify=sm.settings.get("Check_Cert", DEFAULT_SETTINGS["Check_Cert"])
             )
             logger.debug(f"status_code: {response.status_code}")
             response.raise_for_status()
 
-            soup: BeautifulSoup = BeautifulSoup(response.text, "html.parser")
+            soup: BeautifulSoup = parse_html(response.text)
             video_tag = soup.find("video")
             if not video_tag:
                 logger.error("未找到视频文件标签")
-                return False
+                return None
             # video标签下有source标签, 其中有视频链接(src)
             source_tag = video_tag.find("source")
             if not source_tag:
                 logger.error("未找到视频文件source标签")
-                return False
+                return None
             video_file_url: str = str(source_tag.get("src", ""))
             if not video_file_url:
                 logger.error("视频文件source标签中未找到src属性")
-                return False
+                return None
             logger.debug(f"video_file_url: {video_file_url}")
             
             #<div class="tweet-content"> </div>
@@ -145,11 +232,13 @@ class Download_Engine:
             else:
                 video_title = None
         except cloudscraper.exceptions.CloudflareChallengeError as e:
+            record_failure(e)
             logger.error(f"视频URL返回Cloudflare挑战错误: {e}")
-            return False
+            return None
         except Exception as e:
-            logger.error(f"下载视频时发生未知错误: {e}")
-            return False
+            record_failure(e)
+            logger.error(f"解析视频时发生未知错误: {e}")
+            return None
 
         try:
             safe_title: str = re.sub(r'[\/*?:"<>|]', "_", video_title or video_file_url.split("/")[-1].split(".")[0])
@@ -157,88 +246,30 @@ class Download_Engine:
             os.makedirs(save_dir, exist_ok=True)
             save_path = os.path.join(save_dir, f"{safe_title}.mp4")
 
-            headers = DEFAULT_HEADERS.copy()
-            headers["Referer"] = f"{base_url}/"
-            headers["Accept"] = "video/webm,video/ogg,video/*;q=0.9,application/ogg;q=0.7,audio/*;q=0.6,*/*;q=0.5"
-            headers["Accept-Language"] = "zh-CN,zh;q=0.9,en;q=0.8"
-            headers["Accept-Encoding"] = "gzip, deflate, br"
-            headers["Range"] = "bytes=0-"
-            headers["DNT"] = "1"
-            headers["Connection"] = "keep-alive"
-            headers["Sec-Fetch-Dest"] = "video"
-            headers["Sec-Fetch-Mode"] = "no-cors"
-            headers["Sec-Fetch-Site"] = "cross-site"
-            headers["Cache-Control"] = "no-cache"
-            headers["Pragma"] = "no-cache"
-
-            # 使用requests直接下载视频并显示进度
-            logger.info(f"开始下载视频: {safe_title}")
-            
-            # 发起请求获取视频内容
-            response = scraper_manager.get_cloud_scraper().get_instance().get(video_file_url, headers=headers, timeout=30, stream=True)
-            response.raise_for_status()
-            
-            # 获取文件总大小
-            total_size = int(response.headers.get('content-length', 0))
-            
-            # 创建进度跟踪器
-            tracker = DownloadProgressTracker(safe_title)
-            tracker.total_size = total_size
-            
-            # 下载并写入文件
-            downloaded = 0
-            with open(save_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=1024):
-                    if chunk:
-                        f.write(chunk)
-                        f.flush()
-                        downloaded += len(chunk)
-                        tracker.update(downloaded)
-            
-            tracker.finish()
-            
-            if os.path.getsize(save_path) < 100000:  # 大于100KB才可能是视频文件
-                logger.error("文件太小，不可能是视频")
-                os.remove(save_path)
-                return False
-            # 检查文件类型
-            with open(save_path, 'rb') as f:
-                header = f.read(100)
-                if b'ftyp' in header or b'moov' in header or b'mdat' in header:
-                    logger.info("检测到有效的MP4视频文件结构")
-                    logger.info(f"视频下载完成: {save_path}")
-                    return True
-                elif b'<!DOCTYPE' in header or b'<html' in header:
-                    logger.error("下载的是HTML页面")
-                    os.remove(save_path)
-                    return False
-                else:
-                    logger.warning("文件类型未知，但大小正常")
-                    return True
-        
-        except subprocess.TimeoutExpired:
-            logger.error("下载超时")
-            return False
+            headers = Download_Engine._build_media_headers(base_url)
+
+            # 大小、HTML错误页和MP4结构在传输过程中校验
+            return Transfer_Job(JOB_HTTP, safe_title, "Xpv", save_path=save_path, url=video_file_url, headers=headers)
         except OSError as e:
+            record_failure(e)
             logger.error(f"文件操作错误: {e}")
-            return False
-        except Exception as e:
-            logger.error(f"下载视频时发生未知错误: {e}")
-            return False
+            return None
 
     @staticmethod
-    def xpv_download_comic_pic(pic_page_url: str) -> bool:
+    def xpv_resolve_comic_pic(pic_page_url: str) -> Optional[Transfer_Job]:
+        """解析Xpv图集页面, 取得所有图片地址"""
         pic_file_urls: list = []
         try:
             logger.info(f"获取图片页面: {pic_page_url}")
-            response = scraper_manager.get_cloud_scraper().get_instance().get(
+            response = scraper_manager.get_cloud_scraper().get(
                 url=pic_page_url,
                 timeout=5, verify=sm.settings.get("Check_Cert", DEFAULT_SETTINGS["Check_Cert"])
             )
             logger.debug(f"status_code: {response.status_code}")
             response.raise_for_status()
 
-            soup: BeautifulSoup = BeautifulSoup(response.text, "html.parser")
+            # 标题选择器依赖完整的祖先链, 不能局部解析
+            soup: BeautifulSoup = parse_html(response.text)
             img_elements = soup.select("img.comic_img")
             title_element = soup.select_one("html body.photo_cus_body div#wrapper div.container div.row div div.panel.panel-default div.panel-heading div.pull-left")
             title: str = title_element.text.strip() if title_element else "Untitled"
@@ -255,13 +286,14 @@ class Download_Engine:
             logger.info(f"标题: {title}")
         
         except Exception as e:
+            record_failure(e)
             logger.error(f"获取html失败: {e}")
-            return False
+            return None
         
         # 下载图片到./pics/
         if not pic_file_urls:
             logger.error("没有找到图片URL")
-            return False
+            return None
             
         # 创建保存目录
         save_dir = os.path.join(
@@ -271,96 +303,20 @@ class Download_Engine:
         )
         os.makedirs(save_dir, exist_ok=True)
         
-        # 使用DownloadProgressTracker显示进度
-        def download_image(url: str, index: int) -> bool:
-            """下载单张图片"""
-            try:
-                # 从URL获取文件名
-                filename = url.split("/")[-1]
-                if not filename:
-                    filename = f"image_{index}.jpg"
-                    
-                save_path = os.path.join(save_dir, filename)
-                
-                # 如果文件已存在，跳过下载
-                if os.path.exists(save_path):
-                    logger.info(f"文件已存在，跳过下载: {filename}")
-                    return True
-                
-                headers: dict = {
-                    "referer": f"{sm.settings.get("Xpv_Hostname", DEFAULT_SETTINGS["Xpv_Hostname"])}/"
-                }
-                # 下载图片
-                response = scraper_manager.get_cloud_scraper().get_instance().get(
-                    url=url, headers=headers,
-                    timeout=30, verify=sm.settings.get("Check_Cert", DEFAULT_SETTINGS["Check_Cert"])
-                )
-                response.raise_for_status()
-                
-                # 保存图片
-                with open(save_path, "wb") as f:
-                    f.write(response.content)
-                    
-                # logger.debug(f"下载完成: {filename}")
-                return True
-            except Exception as e:
-                logger.error(f"下载图片失败 {url}: {e}")
-                return False
-        
-        # 使用多线程下载图片
-        logger.info("开始多线程下载图片...")
-        max_workers = 5  # 最大线程数
-        success_count = 0
-        
-        # 创建进度跟踪器
-        tracker = DownloadProgressTracker(title)
-        tracker.total_size = len(pic_file_urls)
-        
-        try:
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # 提交所有下载任务
-                future_to_index = {
-                    executor.submit(download_image, url, i): i 
-                    for i, url in enumerate(pic_file_urls)
-                }
-                
-                # 监控下载进度
-                chunk_progress = [0] * len(pic_file_urls)
-                
-                # 使用线程监控进度
-                progress_thread = threading.Thread(
-                    target=tracker.monitor_chunk_progress, 
-                    args=(chunk_progress,)
-                )
-                progress_thread.daemon = True
-                progress_thread.start()
-                
-                # 等待所有任务完成
-                for future in as_completed(future_to_index):
-                    index = future_to_index[future]
-                    try:
-                        if future.result():
-                            success_count += 1
-                            chunk_progress[index] = 1
-                    except Exception as e:
-                        logger.error(f"下载任务出错: {e}")
-                        chunk_progress[index] = 1  # 即使出错也标记为完成
-                        
-            # 停止进度监控
-            tracker.stop()
-            tracker.finish()
-            
-            logger.info(f"下载完成: {success_count}/{len(pic_file_urls)} 张图片下载成功")
-            return success_count > 0
-            
-        except Exception as e:
-            logger.error(f"多线程下载过程中发生错误: {e}")
-            tracker.stop()
-            return False
-    
+        headers: dict = {
+            "referer": f"{sm.settings.get("Xpv_Hostname", DEFAULT_SETTINGS["Xpv_Hostname"])}/"
+        }
+
+        images: list[tuple[str, str]] = []
+        for index, url in enumerate(pic_file_urls):
+            # 从URL获取文件名
+            filename = url.split("/")[-1] or f"image_{index}.jpg"
+            images.append((url, os.path.join(save_dir, filename)))
+        return Transfer_Job(JOB_IMAGES, title, "Xpv", headers=headers, images=images)
+
     @staticmethod
-    def hanime1_download(video: stru_hanime1_video) -> bool:
-        """下载Hanime1视频，优先使用yt_dlp"""
+    def hanime1_resolve(video: stru_hanime1_video) -> Optional[Transfer_Job]:
+        """解析Hanime1视频，优先使用yt_dlp"""
         download_link: str = ""
         try:
             # 1. 更新视频日期信息
@@ -374,76 +330,119 @@ class Download_Engine:
             save_path = os.path.join(video.dpath, f"{video.savetitle}.mp4")
             if os.path.exists(save_path):
                 logger.info(f"文件已存在，跳过下载: {video.savetitle}")
-                return True
+                return Transfer_Job(JOB_DONE, video.savetitle, video.source, save_path=save_path)
             
-            # 4. 根据cloudscraper状态选择下载策略
+            # 4. 根据cloudscraper状态选择解析策略
             if not scraper_manager.is_cs_failed():
-                # cloudscraper可用，直接使用yt_dlp下载
-                logger.info(f"cloudscraper可用，使用yt_dlp直接下载: {video.url}")
-                
-                # 配置yt_dlp参数
-                ydl_opts = {
-                    "outtmpl": save_path,
-                    "quiet": True,
-                    "nocheckcertificate": not sm.settings.get("Check_Cert", DEFAULT_SETTINGS["Check_Cert"]),
-                    "no_warnings": True,
-                    "logtostderr": True,
-                }
-                
-                # 使用yt_dlp下载视频
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # pyright: ignore[reportArgumentType]
-                    ydl.download([video.url])
-                
-                logger.info(f"yt_dlp下载完成: {video.savetitle}")
-                return True
+                # cloudscraper可用，直接使用yt_dlp提取
+                logger.info(f"cloudscraper可用，使用yt_dlp解析: {video.url}")
+                ydl_opts = Download_Engine._hanime1_ydl_opts()
+                info = ytdl_pool.extract_info(ydl_opts, video.url)
+                return Transfer_Job(JOB_YTDL, video.savetitle, video.source, save_path=save_path, url=video.url,
+                                    ydl_opts=ydl_opts, info=info)
             else:
                 # cloudscraper不可用，使用dissionpage获取下载链接
                 logger.info(f"cloudscraper不可用，使用dissionpage获取下载链接: {video.url}")
                 
-                # 获取唯一的Chrome实例
-                main_page = scraper_manager.get_main_chromium_page()
-                
-                # 新建标签页
-                new_tab = main_page.new_tab()
-                
-                try:
-                    # 在新标签页中访问网页
-                    new_tab.get(video.url)
-                    
-                    logger.info("等待下载引导页面出现")
-                    new_tab.wait.ele_displayed(f"#{HANIME1_ELEMENTS['DOWNLOAD_BUTTON']}", timeout=20)
-                    download_guide_link: str = str(new_tab.ele(f"#{HANIME1_ELEMENTS['DOWNLOAD_BUTTON']}").attr("href"))
-                    
-                    new_tab.get(download_guide_link)
-                    logger.info("等待下载链接出现")
-                    new_tab.wait.ele_displayed(f".{HANIME1_ELEMENTS['DOWNLOAD_LINK']}", timeout=20)
-                    download_link = str(new_tab.ele(f".{HANIME1_ELEMENTS['DOWNLOAD_LINK']}").attr("data-url"))
-                    logger.info(f"dissionpage成功获取下载链接: {download_link}")
-                finally:
-                    # 确保标签页被关闭
-                    tabs = main_page.get_tabs()
-                    if len(tabs) > 1:
-                        logger.info("关闭标签页")
-                        try:
-                            new_tab.close()
-                        except:
-                            pass
+                download_link = scraper_manager.get_chromium_scraper().get_download_link(video)
+                logger.info(f"dissionpage成功获取下载链接: {download_link}")
                 
-                # 配置yt_dlp参数
-                ydl_opts = {
-                    "outtmpl": save_path,
-                    "quiet": True,
-                    "nocheckcertificate": not sm.settings.get("Check_Cert", DEFAULT_SETTINGS["Check_Cert"]),
-                    "no_warnings": True,
-                    "logtostderr": True,
-                }
-                
-                # 使用yt_dlp下载视频
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # pyright: ignore[reportArgumentType]
-                    ydl.download([download_link])
-                
-                logger.info(f"dissionpage下载完成: {video.savetitle}")
+                # 下载页给出的一般是mp4直链, 直链走分段下载器, 其它交给yt_dlp
+                base_url: str = sm.settings.get("Hanime1_Hostname", DEFAULT_SETTINGS["Hanime1_Hostname"])
+                headers = Download_Engine._build_media_headers(base_url)
+                return Download_Engine._resolve_media(download_link, save_path, headers, video.savetitle,
+                                                      Download_Engine._hanime1_ydl_opts(), video.source)
+        except Exception as e:
+            record_failure(e)
+            logger.error(f"解析视频失败 {download_link}: {e}")
+            return None
+
+    @staticmethod
+    def transfer(job: Transfer_Job) -> bool:
+        """传输阶段: 只根据解析结果下载, 不再请求页面或操作浏览器
+
+        Args:
+            job: 解析阶段得到的传输任务
+
+        Returns:
+            bool: 下载是否成功
+        """
+        try:
+            if job.kind == JOB_DONE:
                 return True
+            logger.info(f"开始下载: {job.title}")
+            if job.kind == JOB_HTTP:
+                Http_Downloader.download(job.url, job.save_path, job.headers, job.title, job.channel_name)
+            elif job.kind == JOB_YTDL:
+                ytdl_pool.download(job.ydl_opts, job.save_path, job.info, job.channel_name)
+            elif job.kind == JOB_IMAGES:
+                return Download_Engine._transfer_images(job)
+            else:
+                logger.error(f"未知的传输任务类型: {job.kind}")
+                return False
+            logger.info(f"下载完成: {job.title}")
+            return True
+        except Invalid_Content_Error as e:
+            record_failure(e)
+            logger.error(f"下载的不是有效的视频文件: {e}")
+            return False
+        except requests.exceptions.RequestException as e:
+            # requests的异常也是OSError, 要先于文件错误处理
+            Download_Engine._record_transfer_failure(job, e)
+            logger.error(f"下载失败 {job.title}: {e}")
+            return False
+        except OSError as e:
+            record_failure(e)
+            logger.error(f"文件操作错误: {e}")
+            return False
         except Exception as e:
-            logger.error(f"下载视频失败 {download_link}: {e}")
-            return False
\ No newline at end of file
+            Download_Engine._record_transfer_failure(job, e)
+            logger.error(f"下载失败 {job.title}: {e}")
+            return False
+
+    @staticmethod
+    def _record_transfer_failure(job: Transfer_Job, error: BaseException) -> None:
+        """记录传输失败的原因, 缓存的链接被拒绝时记为链接失效, 让流水线删除缓存后重新解析"""
+        if job.from_cache and is_link_rejected(error):
+            record_failure(Expired_Link_Error(str(error)))
+        else:
+            record_failure(error)
+
+    @staticmethod
+    def _transfer_images(job: Transfer_Job) -> bool:
+        """把图集的图片提交到全局图片下载线程池并等待完成"""
+        logger.info("开始多线程下载图片...")
+        success_count = 0
+        # 各图片已下载的字节数
+        chunk_progress: list[int] = [0] * len(job.images)
+
+        # 创建进度跟踪器, 总大小事先未知, 按字节显示进度和速度
+        tracker = DownloadProgressTracker(job.title)
+        progress_thread = threading.Thread(target=tracker.monitor_chunk_progress, args=(chunk_progress,), daemon=True)
+        progress_thread.start()
+
+        try:
+            futures: list[Future] = [
+                image_fetcher.submit(url, save_path, job.headers, chunk_progress, index, job.channel_name)
+                for index, (url, save_path) in enumerate(job.images)
+            ]
+
+            # 等待所有任务完成
+            for future in as_completed(futures):
+                if future.result():
+                    success_count += 1
+
+            # 停止进度监控
+            tracker.stop()
+            tracker.total_size = sum(chunk_progress)
+            tracker.finish()
+
+            logger.info(f"下载完成: {success_count}/{len(job.images)} 张图片下载成功")
+            return success_count > 0
+
+        except Exception as e:
+            record_failure(e)
+            logger.error(f"多线程下载过程中发生错误: {e}")
+            tracker.stop()
+            return False
+
@@ -0,0 +1,115 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any
+
+from ..config.Init_Settings import *
+from ..core.Custom_Struc import *
+from ..utils.Logger import get_logger
+
+logger: logging.Logger = get_logger("下载日志")
+
+# 可以写入日志的任务结构体
+STRUC_TYPES: dict[str, type] = {
+    struc.__name__: struc for struc in (stru_xpv_video, stru_xpv_custom, stru_hanime1_video)
+}
+
+# 任务状态
+STATE_QUEUED: str = "queued"
+STATE_STARTED: str = "started"
+STATE_SUCCESS: str = "success"
+STATE_FAILED: str = "failed"
+
+
+class Download_Journal:
+    """下载队列的持久化日志(SQLite)
+
+    记录每个任务的入队、开始、成功和失败, 程序退出或崩溃后可以恢复未完成的任务
+    """
+
+    def __init__(self, path: str = QUEUE_FILE):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS tasks (
+                    url TEXT PRIMARY KEY,
+                    struc TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    state TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT NOT NULL DEFAULT '',
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            # 已成功的任务不再需要
+            self._conn.execute("DELETE FROM tasks WHERE state = ?", (STATE_SUCCESS,))
+
+    def record_enqueue(self, task: Any, priority: int) -> None:
+        """记录任务入队, 同一URL再次入队时覆盖旧记录"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO tasks (url, struc, data, priority, state, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(url) DO UPDATE SET
+                       struc = excluded.struc, data = excluded.data, priority = excluded.priority,
+                       state = excluded.state, error = '', updated_at = excluded.updated_at""",
+                (task.url, type(task).__name__, json.dumps(task.to_dict(), ensure_ascii=False),
+                 priority, STATE_QUEUED, now, now)
+            )
+
+    def record_start(self, task: Any) -> None:
+        """记录任务开始下载"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE tasks SET state = ?, attempts = attempts + 1, updated_at = ? WHERE url = ?",
+                (STATE_STARTED, time.time(), task.url)
+            )
+
+    def record_success(self, task: Any) -> None:
+        """记录任务下载成功"""
+        self._set_state(task, STATE_SUCCESS, "")
+
+    def record_failure(self, task: Any, error: str = "") -> None:
+        """记录任务下载失败"""
+        self._set_state(task, STATE_FAILED, error)
+
+    def _set_state(self, task: Any, state: str, error: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE tasks SET state = ?, error = ?, updated_at = ? WHERE url = ?",
+                (state, error, time.time(), task.url)
+            )
+
+    def load_unfinished(self) -> list[tuple[Any, int]]:
+        """读取排队中或下载到一半的任务
+
+        Returns:
+            (任务, 优先级)的列表, 按入队顺序排列
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT struc, data, priority FROM tasks WHERE state IN (?, ?) ORDER BY created_at",
+                (STATE_QUEUED, STATE_STARTED)
+            ).fetchall()
+
+        tasks: list[tuple[Any, int]] = []
+        for struc_name, data, priority in rows:
+            struc = STRUC_TYPES.get(struc_name)
+            if struc is None:
+                logger.warning(f"未知的任务类型, 跳过: {struc_name}")
+                continue
+            try:
+                tasks.append((struc.from_dict(json.loads(data)), priority))
+            except Exception as e:
+                logger.error(f"恢复任务失败: {e}")
+        return tasks
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,119 @@
+import logging
+import os
+import queue
+import threading
+from typing import Any, Callable, Optional
+
+from ..config.Init_Settings import *
+from ..config.Settings_Manager import sm
+from ..core.Channel import channel_manager
+from ..core.Download_Engine import JOB_DONE, Download_Engine, Transfer_Job
+from ..core.Download_Queue import Download_Queue
+from ..core.Resolve_Cache import resolve_cache
+from ..utils.CScraper import scraper_manager
+from ..utils.Logger import get_logger
+from ..utils.Retry_Engine import ERROR_EXPIRED_LINK, pop_failure, record_failure
+
+logger: logging.Logger = get_logger("下载流水线")
+
+
+class Download_Pipeline:
+    """两阶段下载流水线
+
+    解析线程从下载队列取任务, 请求页面、解析HTML或驱动浏览器得到Transfer_Job, 经有界交接队列交给
+    传输线程; 传输线程只负责搬运字节。两个线程池分别设置大小, 慢速的浏览器解析不会占用带宽名额,
+    长时间的传输也不会让解析线程空等
+    """
+
+    def __init__(self, download_queue: Download_Queue, on_success: Optional[Callable[[Any], None]] = None):
+        """
+        Args:
+            download_queue: 下载任务队列
+            on_success: 任务下载成功后在传输线程中调用, 参数为下载任务
+        """
+        self.download_queue = download_queue
+        self.on_success = on_success
+        # 交接队列满时解析线程等待, 避免解析结果(可能带有会过期的签名链接)堆积
+        self._handoff: queue.Queue[Transfer_Job] = queue.Queue(
+            maxsize=max(1, int(sm.settings.get("Handoff_Queue_Size", DEFAULT_SETTINGS["Handoff_Queue_Size"])))
+        )
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> None:
+        """启动解析线程和传输线程"""
+        resolvers: int = max(1, int(sm.settings.get("Resolve_Threads", DEFAULT_SETTINGS["Resolve_Threads"])))
+        transfers: int = max(1, int(sm.settings.get("Max_Threads", DEFAULT_SETTINGS["Max_Threads"])))
+        logger.info(f"启动下载流水线: {resolvers} 个解析线程, {transfers} 个传输线程")
+        for index in range(resolvers):
+            self._start_thread(self._resolve_worker, f"Resolver_{index}")
+        for index in range(transfers):
+            self._start_thread(self._transfer_worker, f"Transfer_{index}")
+
+    def _start_thread(self, target: Callable[[], None], name: str) -> None:
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def _resolve_worker(self) -> None:
+        logger.debug(f"解析线程启动: {threading.current_thread().name}")
+        while True:
+            # 这里的get会自动断点
+            task: Any = self.download_queue.get()
+            stats: dict = self.download_queue.stats()
+            logger.info(f"队列还剩下{stats['queued']}个任务 {stats['by_priority']}, 处理中{stats['in_flight']}个, "
+                        f"等待重试{stats['retrying']}个, 等待传输{self._handoff.qsize()}个")
+            logger.debug(f"HTTP连接复用: {scraper_manager.get_cloud_scraper().pool_stats()}")
+
+            # 重试或重复加入的任务直接使用缓存的解析结果
+            job: Optional[Transfer_Job] = resolve_cache.get(task.url)
+            if job is not None:
+                logger.info(f"使用缓存的解析结果: {task.url}")
+            else:
+                try:
+                    # 使用渠道管理器解析任务
+                    job = channel_manager.resolve(task)
+                    if job is not None:
+                        resolve_cache.put(task.url, job)
+                except Exception as e:
+                    logger.error(f"解析任务出错 {task.url}: {e}")
+                    record_failure(e)
+                    job = None
+                if job is None:
+                    # 由队列根据失败分类决定是否退避后重试
+                    self.download_queue.task_failed(task, pop_failure())
+                    continue
+
+            # 缓存命中和新解析的结果都要检查, 部分渠道的解析器本身不检查文件是否已存在
+            if job.kind != JOB_DONE and job.save_path and os.path.exists(job.save_path):
+                logger.info(f"文件已存在，跳过下载: {job.title}")
+                job = Transfer_Job(JOB_DONE, job.title, job.channel_name, save_path=job.save_path)
+
+            job.task = task
+            self._handoff.put(job)
+
+    def _transfer_worker(self) -> None:
+        logger.debug(f"传输线程启动: {threading.current_thread().name}")
+        while True:
+            job: Transfer_Job = self._handoff.get()
+
+            success: bool = False
+            try:
+                success = Download_Engine.transfer(job)
+            except Exception as e:
+                logger.error(f"传输任务出错 {job.title}: {e}")
+                record_failure(e)
+
+            if success:
+                self.download_queue.task_done(job.task, True)
+            else:
+                error_class = pop_failure()
+                if error_class == ERROR_EXPIRED_LINK:
+                    resolve_cache.invalidate(job.task.url)
+                self.download_queue.task_failed(job.task, error_class)
+                continue
+
+            if self.on_success:
+                try:
+                    self.on_success(job.task)
+                except Exception as e:
+                    logger.error(f"下载成功回调出错 {job.title}: {e}")
@@ -0,0 +1,185 @@
+import heapq
+import itertools
+import logging
+import threading
+from typing import Any, Optional
+
+from ..config.Init_Settings import *
+from ..config.Settings_Manager import sm
+from ..core.Download_Journal import Download_Journal
+from ..utils.Logger import get_logger
+from ..utils.Retry_Engine import ERROR_PERMANENT, RETRYABLE_ERRORS, retry_policy
+
+logger: logging.Logger = get_logger("下载队列")
+
+# 优先级, 数值越小越先下载
+PRIORITY_USER: int = 0  # 用户手动发起的下载
+PRIORITY_UPDATE: int = 1  # 检查更新后加入的下载
+PRIORITY_BULK: int = 2  # 批量下载
+
+PRIORITY_NAMES: dict[int, str] = {
+    PRIORITY_USER: "用户",
+    PRIORITY_UPDATE: "检查更新",
+    PRIORITY_BULK: "批量",
+}
+
+
+class Download_Queue:
+    """按任务URL去重的优先级下载队列
+
+    已在队列中或正在下载的URL不会重复加入; 重复加入更高优先级时提升原任务的优先级。
+    传入journal时任务的入队、开始、成功和失败都会写入日志, 重启后可用restore恢复。
+    因临时性错误失败的任务按退避时间重新排队, 每个任务最多重试Task_Retry_Budget次
+    """
+
+    def __init__(self, journal: Optional[Download_Journal] = None):
+        self.journal = journal
+        self._cond = threading.Condition()
+        # 堆中的元素为 (优先级, 序号, URL), 提升优先级后旧元素留在堆里, 取出时跳过
+        self._heap: list[tuple[int, int, str]] = []
+        self._queued: dict[str, tuple[int, Any]] = {}
+        self._in_flight: dict[str, tuple[int, Any]] = {}
+        # 等待退避结束后重新排队的任务
+        self._retrying: dict[str, threading.Timer] = {}
+        # 各任务已重试的次数
+        self._attempts: dict[str, int] = {}
+        self._counter = itertools.count()
+
+    def put(self, task: Any, priority: int = PRIORITY_BULK) -> bool:
+        """加入任务
+
+        Args:
+            task: 下载任务, 以task.url去重
+            priority: 优先级
+
+        Returns:
+            bool: 是否作为新任务加入
+        """
+        key: str = task.url
+        with self._cond:
+            if key in self._in_flight:
+                logger.info(f"任务正在下载, 忽略重复任务: {key}")
+                return False
+            if key in self._retrying:
+                logger.info(f"任务等待重试中, 忽略重复任务: {key}")
+                return False
+            if key in self._queued:
+                old_priority = self._queued[key][0]
+                if priority < old_priority:
+                    self._queued[key] = (priority, task)
+                    heapq.heappush(self._heap, (priority, next(self._counter), key))
+                    if self.journal:
+                        self.journal.record_enqueue(task, priority)
+                    logger.info(f"任务已在队列中, 优先级提升为{PRIORITY_NAMES.get(priority, priority)}: {key}")
+                else:
+                    logger.info(f"任务已在队列中, 忽略重复任务: {key}")
+                return False
+            self._queued[key] = (priority, task)
+            heapq.heappush(self._heap, (priority, next(self._counter), key))
+            if self.journal:
+                self.journal.record_enqueue(task, priority)
+            self._cond.notify()
+            return True
+
+    def get(self) -> Any:
+        """取出优先级最高的任务, 队列为空时阻塞"""
+        with self._cond:
+            while True:
+                while self._heap:
+                    priority, _, key = heapq.heappop(self._heap)
+                    entry = self._queued.get(key)
+                    # 被提升过优先级的旧元素, 跳过
+                    if entry is None or entry[0] != priority:
+                        continue
+                    del self._queued[key]
+                    self._in_flight[key] = entry
+                    if self.journal:
+                        self.journal.record_start(entry[1])
+                    return entry[1]
+                self._cond.wait()
+
+    def task_done(self, task: Any, success: bool = True, error: str = "") -> None:
+        """标记任务处理完毕, 之后同一URL可以再次加入
+
+        Args:
+            task: 下载任务
+            success: 是否下载成功
+            error: 失败原因
+        """
+        with self._cond:
+            self._in_flight.pop(task.url, None)
+            self._attempts.pop(task.url, None)
+            if self.journal:
+                if success:
+                    self.journal.record_success(task)
+                else:
+                    self.journal.record_failure(task, error)
+
+    def task_failed(self, task: Any, error_class: Optional[str]) -> bool:
+        """任务下载失败, 临时性错误且未用完重试次数时安排退避后重新排队, 否则标记为失败
+
+        Args:
+            task: 下载任务
+            error_class: Retry_Engine中的错误分类, None视为permanent
+
+        Returns:
+            bool: 是否会重试
+        """
+        error_class = error_class or ERROR_PERMANENT
+        key: str = task.url
+        budget: int = int(sm.settings.get("Task_Retry_Budget", DEFAULT_SETTINGS["Task_Retry_Budget"]))
+        with self._cond:
+            attempts: int = self._attempts.get(key, 0) + 1
+            if error_class not in RETRYABLE_ERRORS or attempts > budget:
+                if error_class in RETRYABLE_ERRORS:
+                    logger.error(f"任务已重试{budget}次仍失败, 放弃: {key}")
+                self.task_done(task, False, error_class)
+                return False
+
+            priority, _ = self._in_flight.pop(key, (PRIORITY_BULK, task))
+            self._attempts[key] = attempts
+            delay = retry_policy.get_delay(attempts, error_class)
+            logger.warning(f"任务失败({error_class}), {delay:.1f}秒后第{attempts}次重试: {key}")
+            timer = threading.Timer(delay, self._requeue, args=(task, priority))
+            timer.daemon = True
+            self._retrying[key] = timer
+            # 等待期间程序退出时, 重启后仍能从日志恢复
+            if self.journal:
+                self.journal.record_enqueue(task, priority)
+            timer.start()
+            return True
+
+    def _requeue(self, task: Any, priority: int) -> None:
+        with self._cond:
+            self._retrying.pop(task.url, None)
+        self.put(task, priority)
+
+    def restore(self) -> int:
+        """把日志中未完成的任务重新加入队列
+
+        Returns:
+            int: 恢复的任务数
+        """
+        if not self.journal:
+            return 0
+        restored: int = 0
+        for task, priority in self.journal.load_unfinished():
+            if self.put(task, priority):
+                restored += 1
+        if restored:
+            logger.info(f"从日志恢复了 {restored} 个未完成的任务")
+        return restored
+
+    def qsize(self) -> int:
+        """排队中的任务数, 不含正在下载的任务"""
+        with self._cond:
+            return len(self._queued)
+
+    def stats(self) -> dict:
+        """返回排队数、下载中和等待重试的数量以及各优先级的排队数"""
+        with self._cond:
+            by_priority: dict[str, int] = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._queued.values():
+                by_priority[PRIORITY_NAMES[priority]] += 1
+            return {"queued": len(self._queued), "in_flight": len(self._in_flight),
+                    "retrying": len(self._retrying), "by_priority": by_priority}
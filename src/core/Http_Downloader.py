@@ -0,0 +1,490 @@
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
+from urllib.parse import urlparse
+
+from ..core.Disk_Writer import Write_Handle, disk_writer
+from ..core.DownloadProgressTracker import DownloadProgressTracker
+from ..config.Init_Settings import *
+from ..config.Settings_Manager import sm
+from ..utils.CScraper import scraper_manager
+from ..utils.Concurrency_Governor import concurrency_governor
+from ..utils.Rate_Limiter import bandwidth_limiter
+from ..utils.Retry_Engine import Transfer_Error
+from ..utils.Logger import get_logger
+
+logger: logging.Logger = get_logger("分段下载")
+
+
+class Download_Manifest:
+    """断点清单, 与.part文件放在一起, 记录URL、文件大小、已完成区间和校验信息(ETag/Last-Modified)"""
+
+    def __init__(self, path: str, url: str, total_size: int, etag: str, last_modified: str):
+        self.path = path
+        self.url = url
+        self.total_size = total_size
+        self.etag = etag
+        self.last_modified = last_modified
+        # 已完成的区间, 左闭右开 [start, end)
+        self.completed: list[list[int]] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def load(path: str) -> "Download_Manifest | None":
+        """读取断点清单, 不存在或损坏时返回None"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data: dict = json.load(f)
+            manifest = Download_Manifest(path, data.get("url", ""), int(data.get("total_size", 0)),
+                                         data.get("etag", ""), data.get("last_modified", ""))
+            manifest.completed = Download_Manifest._merge([list(r) for r in data.get("completed", [])])
+            return manifest
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"断点清单损坏, 忽略: {e}")
+            return None
+
+    def matches(self, total_size: int, etag: str, last_modified: str) -> bool:
+        """判断服务器上的文件是否仍是清单记录的那个文件"""
+        if self.total_size != total_size:
+            return False
+        if self.etag and etag:
+            return self.etag == etag
+        if self.last_modified and last_modified:
+            return self.last_modified == last_modified
+        # 没有任何校验信息时无法确认, 保守起见重新下载
+        return False
+
+    def add_range(self, start: int, end: int) -> None:
+        """记录区间[start, end)已写入并保存清单"""
+        if end <= start:
+            return
+        with self._lock:
+            self.completed = Download_Manifest._merge(self.completed + [[start, end]])
+            self._save()
+
+    def completed_size(self) -> int:
+        with self._lock:
+            return sum(end - start for start, end in self.completed)
+
+    def missing_ranges(self) -> list[tuple[int, int]]:
+        """返回尚未完成的区间, 左闭右开"""
+        missing: list[tuple[int, int]] = []
+        offset = 0
+        with self._lock:
+            for start, end in self.completed:
+                if start > offset:
+                    missing.append((offset, start))
+                offset = max(offset, end)
+        if offset < self.total_size:
+            missing.append((offset, self.total_size))
+        return missing
+
+    def save(self) -> None:
+        with self._lock:
+            self._save()
+
+    def _save(self) -> None:
+        # 先写临时文件再替换, 避免中途退出留下半个清单
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "url": self.url,
+                "total_size": self.total_size,
+                "etag": self.etag,
+                "last_modified": self.last_modified,
+                "completed": self.completed,
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _merge(ranges: list[list[int]]) -> list[list[int]]:
+        merged: list[list[int]] = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return merged
+
+
+class Invalid_Content_Error(Exception):
+    """服务器返回的不是媒体文件(HTML错误页、Cloudflare挑战页等)或文件结构损坏, 重试也没有意义"""
+
+
+class Range_Ignored_Error(Transfer_Error):
+    """分段请求返回了200(服务器忽略了Range, 或If-Range校验失败说明文件已变化), 需要退回单连接从头下载"""
+
+
+class Content_Validator:
+    """流式内容校验
+
+    根据响应头和最先到达的字节尽早识别HTML错误页或挑战页并中止传输; 下载过程中顺带解析
+    MP4顶层box链, 结束时检查大小和结构, 不需要重新打开文件读取
+    """
+
+    # 可能跨数据块的box头最多16字节, 保留每个数据块末尾的这些字节
+    _TAIL_SIZE: int = 15
+
+    def __init__(self, min_size: int = MIN_MEDIA_SIZE):
+        self.min_size = min_size
+        self.expected_size: int = 0
+        self.is_mp4: bool = False
+        self.boxes: list[bytes] = []
+        # 下一个顶层box头的偏移, None表示无法继续解析
+        self._next_box: Optional[int] = 0
+        self._sniffed = False
+        self._tails: dict[int, bytes] = {}
+        self._lock = threading.Lock()
+
+    def check_headers(self, content_type: str, content_length: int) -> None:
+        """根据Content-Type和文件大小判断是否为媒体文件"""
+        content_type = content_type.split(";")[0].strip().lower()
+        if content_type.startswith("text/") or content_type in ("application/json", "application/xhtml+xml"):
+            raise Invalid_Content_Error(f"服务器返回了 {content_type} 而不是媒体文件")
+        if 0 < content_length < self.min_size:
+            raise Invalid_Content_Error(f"文件太小({content_length}字节), 不可能是视频")
+        self.expected_size = content_length
+
+    def feed(self, offset: int, data: bytes) -> None:
+        """校验写入文件offset处的数据, 发现不是媒体文件时抛出Invalid_Content_Error"""
+        with self._lock:
+            if offset == 0 and not self._sniffed:
+                self._sniff(data)
+            if self._next_box is None:
+                return
+            tail = self._tails.pop(offset, b"")
+            if tail:
+                # box头跨在上一个数据块末尾和这个数据块开头之间
+                self._walk(offset - len(tail), tail + bytes(data[:self._TAIL_SIZE + 1]))
+            self._walk(offset, data)
+            if self._next_box is not None and self._next_box < self.expected_size:
+                self._tails[offset + len(data)] = bytes(data[-self._TAIL_SIZE:])
+
+    def _sniff(self, head: bytes) -> None:
+        self._sniffed = True
+        start: bytes = bytes(head[:512]).lstrip().lower()
+        if start.startswith((b"<!doctype", b"<html", b"<?xml", b"{")):
+            raise Invalid_Content_Error("服务器返回了HTML页面而不是媒体文件")
+        self.is_mp4 = bytes(head[4:8]) == b"ftyp"
+        if not self.is_mp4:
+            # 不是MP4时无法解析box
+            self._next_box = None
+            if bytes(head[:4]) not in (b"\x1aE\xdf\xa3", b"FLV\x01"):
+                logger.warning("文件类型未知, 不是MP4/WebM/FLV")
+
+    def _walk(self, offset: int, data: bytes) -> None:
+        """解析落在data中的顶层box头"""
+        while self._next_box is not None and offset <= self._next_box and self._next_box + 8 <= offset + len(data):
+            pos = self._next_box - offset
+            size = int.from_bytes(data[pos:pos + 4], "big")
+            box_type = bytes(data[pos + 4:pos + 8])
+            if size == 1:
+                # 64位大小
+                if self._next_box + 16 > offset + len(data):
+                    return
+                size = int.from_bytes(data[pos + 8:pos + 16], "big")
+            elif size == 0:
+                # 一直延伸到文件末尾, 不知道文件大小时无法继续
+                if not self.expected_size:
+                    self._next_box = None
+                    return
+                size = self.expected_size - self._next_box
+            if size < 8 or not (box_type.isascii() and box_type.isalnum()):
+                raise Invalid_Content_Error(f"MP4结构损坏: 偏移 {self._next_box} 处的box无效")
+            self.boxes.append(box_type)
+            self._next_box += size
+
+    def finish(self, written: int) -> None:
+        """下载结束后检查大小和结构
+
+        Args:
+            written: 文件的实际字节数
+        """
+        if self.expected_size and written != self.expected_size:
+            raise Transfer_Error(f"文件大小与Content-Length不符: {written}/{self.expected_size}")
+        if written < self.min_size:
+            raise Invalid_Content_Error(f"文件太小({written}字节), 不可能是视频")
+        if not self.is_mp4:
+            return
+        if self._next_box != written:
+            # 续传或分段乱序时部分box头没有经过这里
+            logger.warning("未能完整解析MP4结构, 跳过结构校验")
+            return
+        if b"moov" not in self.boxes or b"mdat" not in self.boxes:
+            raise Invalid_Content_Error(f"MP4结构不完整, 顶层box: {[box.decode() for box in self.boxes]}")
+        logger.info("检测到有效的MP4视频文件结构")
+
+
+class Http_Downloader:
+    """直链媒体下载器
+
+    先探测Content-Length/Accept-Ranges, 支持Range时按字节区间多连接并行写入同一个预分配文件,
+    否则退回单连接流式下载。数据先写入.part文件, 支持Range时配合断点清单续传, 完成后原子重命名
+    """
+
+    @staticmethod
+    def is_direct_media_url(url: str) -> bool:
+        """判断URL是否指向单个渐进式媒体文件(如mp4), 这类链接不需要yt_dlp探测格式和合并
+
+        Args:
+            url: 媒体URL
+
+        Returns:
+            是否为直链媒体文件
+        """
+        path: str = urlparse(url).path.lower()
+        return path.endswith(DIRECT_MEDIA_EXTENSIONS)
+
+    @staticmethod
+    def probe(url: str, headers: dict) -> dict:
+        """探测文件大小、服务器是否支持Range以及校验信息
+
+        Args:
+            url: 文件URL
+            headers: 请求头
+
+        Returns:
+            包含total_size(未知时为0)、accept_ranges、etag、last_modified、content_type的字典
+        """
+        probe_headers = headers.copy()
+        probe_headers["Range"] = "bytes=0-0"
+        response = scraper_manager.get_cloud_scraper().get(
+            url, headers=probe_headers, timeout=10, stream=True,
+            verify=sm.settings.get("Check_Cert", DEFAULT_SETTINGS["Check_Cert"])
+        )
+        try:
+            response.raise_for_status()
+            info: dict = {
+                "total_size": 0,
+                "accept_ranges": False,
+                "etag": response.headers.get("ETag", ""),
+                "last_modified": response.headers.get("Last-Modified", ""),
+                "content_type": response.headers.get("Content-Type", ""),
+            }
+            if response.status_code == 206:
+                # Content-Range: bytes 0-0/12345
+                match = re.search(r"/(\d+)\s*$", response.headers.get("Content-Range", ""))
+                if match:
+                    info["total_size"] = int(match.group(1))
+                    info["accept_ranges"] = True
+                    return info
+            info["total_size"] = int(response.headers.get("Content-Length", 0))
+            info["accept_ranges"] = response.headers.get("Accept-Ranges", "").lower() == "bytes" and info["total_size"] > 0
+            return info
+        finally:
+            response.close()
+
+    @staticmethod
+    def download(url: str, save_path: str, headers: dict, title: str, channel_name: str = "") -> None:
+        """下载文件到save_path, 失败时抛出异常, 已下载的部分保留在.part文件中供下次续传
+
+        传输过程中校验内容, 发现不是媒体文件时抛出Invalid_Content_Error并删除.part文件
+
+        Args:
+            url: 文件URL
+            save_path: 保存路径
+            headers: 请求头
+            title: 进度显示用的标题
+            channel_name: 所属渠道, 用于渠道限速
+        """
+        headers = headers.copy()
+        headers.pop("Range", None)
+        # 分段时必须拿到原始字节, 否则Content-Length和Range对不上
+        headers["Accept-Encoding"] = "identity"
+
+        part_path = f"{save_path}{PART_SUFFIX}"
+        manifest_path = f"{part_path}.json"
+
+        # 分段连接都按主机计入并发名额, 媒体主机的并发上限要容纳所有传输线程的分段
+        concurrency_governor.mark_media_host(url)
+        info = Http_Downloader.probe(url, headers)
+        total_size: int = info["total_size"]
+        logger.debug(f"文件大小: {total_size}, 支持Range: {info['accept_ranges']}")
+
+        validator = Content_Validator()
+        try:
+            # 在预分配文件之前就排除HTML错误页和过小的文件
+            validator.check_headers(info["content_type"], total_size)
+            Http_Downloader._transfer(url, part_path, headers, title, info, validator, channel_name)
+        except Invalid_Content_Error:
+            for path in (part_path, manifest_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+
+        os.replace(part_path, save_path)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+
+    @staticmethod
+    def _transfer(url: str, part_path: str, headers: dict, title: str, info: dict,
+                  validator: Content_Validator, channel_name: str) -> None:
+        """根据探测结果选择分段续传或单连接下载"""
+        total_size: int = info["total_size"]
+        manifest_path = f"{part_path}.json"
+        if info["accept_ranges"]:
+            manifest = Download_Manifest.load(manifest_path)
+            if manifest and os.path.exists(part_path) and manifest.matches(total_size, info["etag"], info["last_modified"]):
+                logger.info(f"从断点继续下载: {title} ({manifest.completed_size()}/{total_size})")
+                manifest.url = url
+            else:
+                manifest = Download_Manifest(manifest_path, url, total_size, info["etag"], info["last_modified"])
+                # 预分配文件, 各分段直接写入自己的偏移
+                with open(part_path, "wb") as f:
+                    f.truncate(total_size)
+                manifest.save()
+            range_headers = headers.copy()
+            if_range = Http_Downloader._get_if_range(info)
+            if if_range:
+                # 文件在两次请求之间变化时服务器会返回200而不是206
+                range_headers["If-Range"] = if_range
+            try:
+                Http_Downloader._download_segmented(url, part_path, range_headers, title, manifest, validator, channel_name)
+                return
+            except Range_Ignored_Error as e:
+                logger.warning(f"{e}, 改为单连接从头下载: {title}")
+                if os.path.exists(manifest_path):
+                    os.remove(manifest_path)
+                # 已校验过的分段作废, 重新校验
+                validator = Content_Validator()
+        Http_Downloader._download_single(url, part_path, headers, title, validator, channel_name)
+
+    @staticmethod
+    def _get_if_range(info: dict) -> str:
+        """选择If-Range的校验值: 只能用强ETag(RFC 9110不允许弱ETag), 没有时用Last-Modified"""
+        etag: str = info["etag"]
+        if etag and not etag.startswith("W/"):
+            return etag
+        return info["last_modified"]
+
+    @staticmethod
+    def _download_single(url: str, save_path: str, headers: dict, title: str,
+                         validator: Content_Validator, channel_name: str) -> None:
+        """单连接流式下载, 服务器不支持Range, 只能从头开始"""
+        logger.info(f"使用单连接下载: {title}")
+        response = scraper_manager.get_cloud_scraper().get(
+            url, headers=headers, timeout=30, stream=True,
+            verify=sm.settings.get("Check_Cert", DEFAULT_SETTINGS["Check_Cert"])
+        )
+        try:
+            response.raise_for_status()
+            content_length = int(response.headers.get("Content-Length", 0))
+            validator.check_headers(response.headers.get("Content-Type", ""), content_length)
+            tracker = DownloadProgressTracker(title)
+            tracker.total_size = content_length or None
+
+            def on_read(offset: int, data: memoryview) -> None:
+                validator.feed(offset, data)
+                tracker.update(offset + len(data))
+                bandwidth_limiter.throttle(channel_name, len(data))
+
+            # 直接从底层连接读取时也要解压
+            response.raw.decode_content = True
+            handle = disk_writer.open(save_path, "wb")
+            try:
+                downloaded = disk_writer.copy_stream(response.raw, handle, 0, on_read=on_read)
+            finally:
+                handle.close()
+            validator.finish(downloaded)
+            tracker.finish()
+        finally:
+            response.close()
+
+    @staticmethod
+    def _split_missing(manifest: Download_Manifest) -> list[tuple[int, int]]:
+        """把未完成的区间切分成不超过Download_Segments个连接能并行下载的分段"""
+        segments: int = max(1, int(sm.settings.get("Download_Segments", DEFAULT_SETTINGS["Download_Segments"])))
+        missing = manifest.missing_ranges()
+        missing_size = sum(end - start for start, end in missing)
+        segment_size = max(MIN_SEGMENT_SIZE, -(-missing_size // segments))
+
+        ranges: list[tuple[int, int]] = []
+        for start, end in missing:
+            for offset in range(start, end, segment_size):
+                ranges.append((offset, min(offset + segment_size, end)))
+        return ranges
+
+    @staticmethod
+    def _download_segmented(url: str, save_path: str, headers: dict, title: str,
+                            manifest: Download_Manifest, validator: Content_Validator, channel_name: str) -> None:
+        """多连接分段下载, 只下载清单中尚未完成的区间"""
+        ranges = Http_Downloader._split_missing(manifest)
+        segments: int = max(1, int(sm.settings.get("Download_Segments", DEFAULT_SETTINGS["Download_Segments"])))
+        logger.info(f"使用 {min(segments, len(ranges))} 个连接分段下载 {len(ranges)} 个区间: {title}")
+
+        # 第一项为已完成的字节数, 其余为各分段的进度
+        chunk_progress: list[int] = [manifest.completed_size()] + [0] * len(ranges)
+        stop_event = threading.Event()
+
+        tracker = DownloadProgressTracker(title)
+        tracker.total_size = manifest.total_size
+        tracker.last_downloaded = chunk_progress[0]
+        progress_thread = threading.Thread(target=tracker.monitor_chunk_progress, args=(chunk_progress,), daemon=True)
+        progress_thread.start()
+
+        # 所有分段共用一个文件句柄, 由后台写入线程按偏移写入预分配的文件
+        handle = disk_writer.open(save_path, "r+b")
+        try:
+            if ranges:
+                with ThreadPoolExecutor(max_workers=min(segments, len(ranges))) as executor:
+                    futures = [
+                        executor.submit(Http_Downloader._download_range, url, handle, headers,
+                                        start, end, chunk_progress, index + 1, stop_event, manifest,
+                                        validator, channel_name)
+                        for index, (start, end) in enumerate(ranges)
+                    ]
+                    try:
+                        for future in as_completed(futures):
+                            future.result()
+                    except Exception:
+                        # 一个分段失败则通知其余分段尽快退出
+                        stop_event.set()
+                        raise
+        finally:
+            tracker.stop()
+            # 等待写完并更新断点清单
+            handle.close()
+
+        if manifest.missing_ranges():
+            raise Transfer_Error(f"下载不完整, 仍缺少 {len(manifest.missing_ranges())} 个区间")
+        validator.finish(manifest.total_size)
+        tracker.finish()
+
+    @staticmethod
+    def _download_range(url: str, handle: Write_Handle, headers: dict, start: int, end: int,
+                        chunk_progress: list, index: int, stop_event: threading.Event,
+                        manifest: Download_Manifest, validator: Content_Validator, channel_name: str) -> None:
+        """下载[start, end)字节区间并写入文件对应位置, 数据每写入一段就更新断点清单"""
+        range_headers = headers.copy()
+        range_headers["Range"] = f"bytes={start}-{end - 1}"
+        response = scraper_manager.get_cloud_scraper().get(
+            url, headers=range_headers, timeout=30, stream=True,
+            verify=sm.settings.get("Check_Cert", DEFAULT_SETTINGS["Check_Cert"])
+        )
+        try:
+            response.raise_for_status()
+            if response.status_code == 200:
+                raise Range_Ignored_Error(f"分段 {index} 返回了200而不是206")
+            if response.status_code != 206:
+                raise Transfer_Error(f"分段 {index} 未返回206, 实际状态码: {response.status_code}")
+
+            def on_read(offset: int, data: memoryview) -> None:
+                validator.feed(offset, data)
+                chunk_progress[index] = offset + len(data) - start
+                bandwidth_limiter.throttle(channel_name, len(data))
+
+            response.raw.decode_content = True
+            # 断点清单在数据真正写入文件后才记录
+            written = disk_writer.copy_stream(response.raw, handle, start, end - start, on_read=on_read,
+                                              stop_event=stop_event, on_flush=manifest.add_range)
+
+            if not stop_event.is_set() and written != end - start:
+                raise Transfer_Error(f"分段 {index} 数据不完整: {written}/{end - start}")
+        finally:
+            response.close()
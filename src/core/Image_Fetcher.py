@@ -0,0 +1,116 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from ..config.Init_Settings import *
+from ..config.Settings_Manager import sm
+from ..core.Disk_Writer import disk_writer
+from ..utils.CScraper import scraper_manager
+from ..utils.Rate_Limiter import bandwidth_limiter
+from ..utils.Logger import get_logger
+
+logger: logging.Logger = get_logger("图片下载")
+
+
+class Image_Fetcher:
+    """全局共享的图片下载线程池
+
+    所有图集共用一个有上限的线程池, 并限制每个主机的并发数; 图片读入共享的写缓冲区后由后台写入线程
+    写盘, 进度按字节统计
+    """
+
+    def __init__(self):
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._host_semaphores: dict[str, threading.BoundedSemaphore] = {}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """延迟创建线程池"""
+        with self._lock:
+            if self._executor is None:
+                max_workers: int = int(sm.settings.get("Image_Threads", DEFAULT_SETTINGS["Image_Threads"]))
+                logger.info(f"创建图片下载线程池, 线程数: {max_workers}")
+                self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="Image_Fetcher")
+            return self._executor
+
+    def _get_host_semaphore(self, url: str) -> threading.BoundedSemaphore:
+        """获取主机对应的并发信号量"""
+        host: str = urlparse(url).netloc
+        with self._lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(
+                    int(sm.settings.get("Image_Per_Host", DEFAULT_SETTINGS["Image_Per_Host"]))
+                )
+                self._host_semaphores[host] = semaphore
+            return semaphore
+
+    def submit(self, url: str, save_path: str, headers: dict, progress: list[int], index: int,
+               channel_name: str = "") -> Future:
+        """提交一张图片的下载任务
+
+        Args:
+            url: 图片URL
+            save_path: 保存路径
+            headers: 请求头
+            progress: 各图片已下载字节数的列表, 供进度跟踪器汇总
+            index: 本图片在progress中的位置
+            channel_name: 所属渠道, 用于渠道限速
+
+        Returns:
+            Future, 结果为是否下载成功
+        """
+        return self._get_executor().submit(self._fetch, url, save_path, headers, progress, index, channel_name)
+
+    def _fetch(self, url: str, save_path: str, headers: dict, progress: list[int], index: int,
+               channel_name: str) -> bool:
+        """下载单张图片"""
+        try:
+            # 如果文件已存在，跳过下载
+            if os.path.exists(save_path):
+                logger.info(f"文件已存在，跳过下载: {os.path.basename(save_path)}")
+                progress[index] = os.path.getsize(save_path)
+                return True
+
+            with self._get_host_semaphore(url):
+                response = scraper_manager.get_cloud_scraper().get(
+                    url=url, headers=headers, timeout=30, stream=True,
+                    verify=sm.settings.get("Check_Cert", DEFAULT_SETTINGS["Check_Cert"])
+                )
+                try:
+                    response.raise_for_status()
+                    # 直接从底层连接读取时也要解压
+                    response.raw.decode_content = True
+
+                    def on_read(offset: int, data: memoryview) -> None:
+                        progress[index] = offset + len(data)
+                        bandwidth_limiter.throttle(channel_name, len(data))
+
+                    # 先写入.part文件, 完整写完再重命名, 避免中断后留下被当作已下载的残缺图片
+                    # 图片小而多且可以重新下载, 逐个fsync的代价远大于收益
+                    part_path = f"{save_path}{PART_SUFFIX}"
+                    handle = disk_writer.open(part_path, "wb", fsync=False)
+                    try:
+                        disk_writer.copy_stream(response.raw, handle, 0, on_read=on_read)
+                    finally:
+                        handle.close()
+                    os.replace(part_path, save_path)
+                finally:
+                    response.close()
+            return True
+        except Exception as e:
+            logger.error(f"下载图片失败 {url}: {e}")
+            return False
+
+    def close(self) -> None:
+        """关闭线程池"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# 创建全局图片下载器
+image_fetcher = Image_Fetcher()
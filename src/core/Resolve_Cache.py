@@ -0,0 +1,114 @@
+import calendar
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from ..config.Init_Settings import *
+from ..config.Settings_Manager import sm
+from ..core.Download_Engine import JOB_DONE, Transfer_Job
+from ..utils.Logger import get_logger
+
+logger: logging.Logger = get_logger("解析缓存")
+
+# 签名链接中表示过期时间(Unix时间戳)的参数
+EXPIRY_PARAMS: tuple = ("expires", "expire", "exp", "e", "x-expires", "validto", "deadline")
+
+
+def get_link_expiry(url: str) -> Optional[float]:
+    """从签名链接的参数中读取过期时间
+
+    Args:
+        url: 媒体URL
+
+    Returns:
+        过期的Unix时间戳, 链接没有带过期参数时返回None
+    """
+    params: dict[str, list[str]] = {key.lower(): value for key, value in parse_qs(urlparse(url).query).items()}
+    # AWS风格: X-Amz-Date为签名时间, X-Amz-Expires为有效秒数
+    if "x-amz-date" in params and "x-amz-expires" in params:
+        try:
+            # X-Amz-Date是UTC时间, 用timegm换算, 不受本地时区和夏令时影响
+            signed_at = calendar.timegm(time.strptime(params["x-amz-date"][0], "%Y%m%dT%H%M%SZ"))
+            return signed_at + int(params["x-amz-expires"][0])
+        except ValueError:
+            return None
+    for name in EXPIRY_PARAMS:
+        value: str = params.get(name, [""])[0]
+        # 只认10位的时间戳, 避免把其他含义的短参数当成过期时间
+        if value.isdigit() and len(value) == 10:
+            return float(value)
+    return None
+
+
+class Resolve_Cache:
+    """解析结果缓存
+
+    以页面URL为键缓存Transfer_Job(最终媒体URL、请求头、yt_dlp信息等), 失败重试或重复加入队列时
+    直接进入传输阶段。过期时间取签名链接自带的过期时间和Resolve_Cache_TTL中较早者
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 页面URL -> (过期时间, 传输任务), 按加入顺序排列, 超出上限时淘汰最早的
+        self._entries: OrderedDict[str, tuple[float, Transfer_Job]] = OrderedDict()
+
+    def _get_expiry(self, job: Transfer_Job) -> float:
+        """计算解析结果的过期时间"""
+        expiry: float = time.time() + float(sm.settings.get("Resolve_Cache_TTL", DEFAULT_SETTINGS["Resolve_Cache_TTL"]))
+        urls: list[str] = [job.url] + [url for url, _ in job.images]
+        # yt_dlp选中的格式各自带有签名链接
+        for fmt in job.info.get("requested_formats") or [job.info]:
+            if fmt.get("url"):
+                urls.append(fmt["url"])
+        for url in urls:
+            link_expiry = get_link_expiry(url) if url else None
+            if link_expiry is not None:
+                expiry = min(expiry, link_expiry - RESOLVE_CACHE_MARGIN)
+        return expiry
+
+    def get(self, page_url: str) -> Optional[Transfer_Job]:
+        """取出未过期的解析结果, 返回副本"""
+        with self._lock:
+            entry = self._entries.get(page_url)
+            if entry is None:
+                return None
+            expiry, job = entry
+            if expiry <= time.time():
+                del self._entries[page_url]
+                logger.debug(f"解析结果已过期: {page_url}")
+                return None
+            job = copy.deepcopy(job)
+        job.from_cache = True
+        return job
+
+    def put(self, page_url: str, job: Transfer_Job) -> None:
+        """缓存解析结果, 文件已存在的结果不缓存"""
+        if job.kind == JOB_DONE:
+            return
+        expiry = self._get_expiry(job)
+        if expiry <= time.time():
+            return
+        task, job.task = job.task, None
+        try:
+            cached = copy.deepcopy(job)
+        finally:
+            job.task = task
+        with self._lock:
+            self._entries.pop(page_url, None)
+            self._entries[page_url] = (expiry, cached)
+            while len(self._entries) > RESOLVE_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, page_url: str) -> None:
+        """链接失效(403/410)时删除缓存"""
+        with self._lock:
+            if self._entries.pop(page_url, None) is not None:
+                logger.info(f"媒体链接已失效, 删除解析缓存: {page_url}")
+
+
+# 创建全局解析缓存
+resolve_cache = Resolve_Cache()
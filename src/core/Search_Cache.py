@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from ..config.Init_Settings import *
+from ..config.Settings_Manager import sm
+from ..utils.Logger import get_logger
+
+logger: logging.Logger = get_logger("搜索缓存")
+
+
+class Search_Cache:
+    """搜索结果缓存
+
+    以(渠道, 关键词, 页码)为键缓存解析后的搜索结果(结果卡片数和构造stru_*所需的字典), Search_Cache_TTL内重复搜索
+    直接使用缓存; 过期后若网站给过ETag/Last-Modified, 先发条件请求, 304时沿用缓存并延长有效期
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (渠道, 关键词, 页码) -> {"url", "cards", "results", "etag", "last_modified", "expires"}
+        self._entries: OrderedDict[tuple[str, str, int], dict] = OrderedDict()
+        # 关键词 -> (过期时间, Xpv搜索ID)
+        self._searchids: dict[str, tuple[float, str]] = {}
+
+    @staticmethod
+    def _get_ttl() -> float:
+        return float(sm.settings.get("Search_Cache_TTL", DEFAULT_SETTINGS["Search_Cache_TTL"]))
+
+    def get_fresh(self, channel_name: str, keyword: str, page: int) -> Optional[tuple[int, list[dict]]]:
+        """取出未过期的一页结果(结果卡片数, 结果列表), 没有或已过期时返回None"""
+        with self._lock:
+            entry = self._entries.get((channel_name, keyword, page))
+            if entry is None or entry["expires"] <= time.time():
+                return None
+            return entry["cards"], list(entry["results"])
+
+    def get_validators(self, channel_name: str, keyword: str, page: int, url: str) -> dict:
+        """生成条件请求头, 只有缓存的页面URL与本次请求相同时才有意义"""
+        with self._lock:
+            entry = self._entries.get((channel_name, keyword, page))
+            if entry is None or entry["url"] != url:
+                return {}
+            headers: dict = {}
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+            return headers
+
+    def revalidated(self, channel_name: str, keyword: str, page: int) -> Optional[tuple[int, list[dict]]]:
+        """条件请求返回304时调用, 延长缓存有效期并返回缓存的结果"""
+        with self._lock:
+            entry = self._entries.get((channel_name, keyword, page))
+            if entry is None:
+                return None
+            entry["expires"] = time.time() + self._get_ttl()
+            return entry["cards"], list(entry["results"])
+
+    def put(self, channel_name: str, keyword: str, page: int, url: str, cards: int, results: list[dict],
+            response_headers: Any = None) -> None:
+        """缓存一页结果
+
+        Args:
+            channel_name: 渠道名称
+            keyword: 搜索关键词
+            page: 页码
+            url: 页面URL
+            cards: 页面上的结果卡片数, 用于判断是否还有下一页
+            results: 解析出的结果字典列表
+            response_headers: 响应头, 用于记录ETag/Last-Modified; 浏览器获取的页面没有响应头
+        """
+        response_headers = response_headers or {}
+        with self._lock:
+            key = (channel_name, keyword, page)
+            self._entries.pop(key, None)
+            self._entries[key] = {
+                "url": url,
+                "cards": cards,
+                "results": list(results),
+                "etag": response_headers.get("ETag", ""),
+                "last_modified": response_headers.get("Last-Modified", ""),
+                "expires": time.time() + self._get_ttl(),
+            }
+            while len(self._entries) > SEARCH_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def get_searchid(self, keyword: str) -> str:
+        """取出未过期的Xpv搜索ID, 没有时返回空字符串"""
+        with self._lock:
+            entry = self._searchids.get(keyword)
+            if entry is None:
+                return ""
+            expires, searchid = entry
+            if expires <= time.time():
+                del self._searchids[keyword]
+                return ""
+            return searchid
+
+    def put_searchid(self, keyword: str, searchid: str) -> None:
+        """缓存Xpv搜索ID, 之后的搜索直接读取结果页, 不必再发送受频率限制的搜索请求"""
+        ttl: float = float(sm.settings.get("Xpv_Searchid_TTL", DEFAULT_SETTINGS["Xpv_Searchid_TTL"]))
+        with self._lock:
+            self._searchids[keyword] = (time.time() + ttl, searchid)
+
+    def drop_searchid(self, keyword: str) -> None:
+        """缓存的搜索ID失效(结果页为空或出错)时删除"""
+        with self._lock:
+            self._searchids.pop(keyword, None)
+
+
+# 创建全局搜索缓存
+search_cache = Search_Cache()
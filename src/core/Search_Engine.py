@@ -1,10 +1,12 @@
 import logging
 import re
-import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterator, TypeVar
 from urllib.parse import urlencode, urljoin
 
 import cloudscraper
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
 import urllib3
 
 # 禁用不安全的HTTPS请求警告
@@ -12,25 +14,205 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 from ..core.Channel import Channel, channel_manager
 from ..core.Custom_Struc import *
+from ..core.Search_Cache import search_cache
 from ..config.Init_Settings import *
 from ..config.Settings_Manager import sm
 from ..utils.CScraper import scraper_manager
+from ..utils.Html_Parser import has_class, parse_html, parse_pool
 from ..utils.Logger import get_logger
 
 logger: logging.Logger = get_logger("搜索")
 
+T = TypeVar("T")
+
+# 搜索结果页只需要解析结果卡片
+XPV_RESULT_CLASS: str = "col-xs-6 col-sm-4 col-md-3 col-lg-3 list-col col-xl-2"
+XPV_RESULT_CARDS = SoupStrainer("div", class_=XPV_RESULT_CLASS)
+HANIME1_RESULT_CARDS = SoupStrainer("div", class_=has_class("video-item-container"))
+
+
+# 以下解析函数在模块顶层定义, 可以交给解析进程池: 传入原始HTML, 返回结果卡片数和构造stru_*所需的字典
+def parse_xpv_result_cards(html: str, target_url: str) -> tuple[int, list[dict]]:
+    """解析Xpv搜索结果页面中的视频卡片
+    
+    Args:
+        html: 搜索结果页面的HTML
+        target_url: 搜索结果页面的URL
+        
+    Returns:
+        (结果卡片数, stru_xpv_video的构造数据列表), 翻页按卡片数判断, 个别卡片缺少链接不影响翻页
+    """
+    soup = parse_html(html, XPV_RESULT_CARDS)
+    video_list: list[dict] = []
+    # 每个视频的div标签
+    current_video_list = soup.find_all("div", class_=XPV_RESULT_CLASS)
+    for div in current_video_list:
+        # div标签下有a标签, 其中有视频链接(href)和标题(title)
+        a_tag = div.find("a", href=True)
+        if a_tag:
+            href: str = str(a_tag["href"])
+            title: str = str(a_tag.get("title", ""))
+            # 提取title中[和]中间的字符串,如果没有则使用unknown
+            author = re.search(r"\[(.*?)\]", title)
+            author = author.group(1) if author else "unknown"
+            # a标签下有img标签, 其中有视频上传日期(隐藏在data-src中,需要加工提取)
+            # src示例: https://gamezy.xunge.cyou/titlep/2025/1107/3rkmgw2vadq7.jpg 需要提取2025 11 07
+            img_tag = a_tag.find("img", src=True)
+            if img_tag:
+                data_src: str = str(img_tag["data-src"])
+                match = re.search(r"/(\d{4})/(\d{2})(\d{2})/", data_src)
+                if match:
+                    year, month, day = match.groups()
+                    updatedAt = f"{year}-{month}-{day}"
+                else:
+                    updatedAt = ""
+            else:
+                updatedAt = ""
+
+            video_list.append({"title": title, "url": href, "author": author, "furl": target_url, "updatedAt": updatedAt})
+    return len(current_video_list), video_list
+
+
+def parse_hanime1_result_cards(html: str, furl: str) -> tuple[int, list[dict]]:
+    """解析Hanime1搜索结果页面中的视频卡片
+    
+    Args:
+        html: 搜索结果页面的HTML
+        furl: 搜索结果页面的完整URL
+        
+    Returns:
+        (结果卡片数, stru_hanime1_video的构造数据列表), 翻页按卡片数判断
+    """
+    soup = parse_html(html, HANIME1_RESULT_CARDS)
+    video_list: list[dict] = []
+    # 查找所有视频项容器，使用select方法提高效率
+    current_video_list = soup.select("div.video-item-container")
+    
+    for div in current_video_list:
+        # div标签本身有标题title, div下的a标签有视频链接href
+        title = str(div.get("title", ""))
+        # 从title中提取author,如果没有则使用unknown
+        author = re.search(r"\[(.*?)\]", title)
+        author = author.group(1) if author else "unknown"
+        a_tag = div.select_one("a[href]")
+        if a_tag and a_tag.has_attr("href"):
+            href = str(a_tag["href"])
+            video_list.append({"title": title, "url": href, "author": author, "furl": furl})
+    
+    return len(current_video_list), video_list
+
 
 class Search_Engine:
-    _last_search_timestamp: float = 0
     @staticmethod
-    def xpv_search_video(keyword: str, classid: int=21) -> list[stru_xpv_video]:
-        current_time: float = time.time()
-        while current_time - Search_Engine._last_search_timestamp < 5.5:
-            logger.info(f"距离上次搜索过了 {current_time - Search_Engine._last_search_timestamp:.2f}/5.5 秒")
-            time.sleep(0.5)
-            current_time = time.time()
-        Search_Engine._last_search_timestamp = current_time
+    def _iter_pages(fetch_page: Callable[[int], tuple[int, list[T]]], first_page: int) -> Iterator[list[T]]:
+        """按页码顺序逐页产出搜索结果
+        
+        先单独获取第一页, 满页时再以Search_Page_Window为窗口并发获取后续页面。遇到结果卡片不满SEARCH_PAGE_SIZE个
+        的页面即停止, 已提交但还没开始的页面被取消。各请求仍经过按主机的并发控制器, 不会超出主机的承受能力
+        
+        Args:
+            fetch_page: 获取并解析一页的函数, 参数为页码, 返回(结果卡片数, 结果列表), 出错时异常在轮到该页时抛出
+            first_page: 第一页的页码
+            
+        Yields:
+            每一页的结果列表
+        """
+        last_page: int = first_page + MAX_PAGE - 1
+        cards, page_items = fetch_page(first_page)
+        yield page_items
+        if cards < SEARCH_PAGE_SIZE:
+            logger.info(f"第{first_page}页只有 {cards} 个结果，停止翻页")
+            return
+
+        window: int = max(1, int(sm.settings.get("Search_Page_Window", DEFAULT_SETTINGS["Search_Page_Window"])))
+        executor = ThreadPoolExecutor(max_workers=window, thread_name_prefix="Search_Page")
+        futures: dict[int, Future] = {}
+        next_page: int = first_page + 1
+        try:
+            for page in range(first_page + 1, last_page + 1):
+                while next_page <= last_page and len(futures) < window:
+                    futures[next_page] = executor.submit(fetch_page, next_page)
+                    next_page += 1
+                cards, page_items = futures.pop(page).result()
+                yield page_items
+                if cards < SEARCH_PAGE_SIZE:
+                    logger.info(f"第{page}页只有 {cards} 个结果，停止翻页")
+                    return
+            logger.warning(f"搜索达到上限, 暂停搜索")
+        finally:
+            # 取消超出最后一页的请求, 已经开始的请求结果直接丢弃
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _get_cached_page(channel_name: str, keyword: str, page: int, get_url: Callable[[], str],
+                         fetch: Callable[[str, dict], tuple[int, str, Any]],
+                         parse: Callable[[str, str], tuple[int, list[dict]]], force_refresh: bool) -> tuple[int, list[dict]]:
+        """获取一页搜索结果的构造数据, 未过期时直接使用搜索缓存
+        
+        Args:
+            channel_name: 渠道名称
+            keyword: 搜索关键词, 与渠道、页码一起作为缓存键
+            page: 页码
+            get_url: 返回页面URL, 只在需要请求时调用
+            fetch: 发送请求, 参数为URL和条件请求头, 返回(状态码, HTML, 响应头)
+            parse: 模块顶层的解析函数, 参数为HTML和页面URL, 开启解析进程池时在子进程中执行
+            force_refresh: 忽略未过期的缓存; 网站支持时仍用条件请求确认页面是否变化
+            
+        Returns:
+            (结果卡片数, 构造stru_*所需的字典列表)
+        """
+        if not force_refresh:
+            cached = search_cache.get_fresh(channel_name, keyword, page)
+            if cached is not None:
+                logger.info(f"使用缓存的{channel_name}搜索结果 第{page}页")
+                return cached
+
+        url: str = get_url()
+        status_code, html, response_headers = fetch(url, search_cache.get_validators(channel_name, keyword, page, url))
+        if status_code == 304:
+            cached = search_cache.revalidated(channel_name, keyword, page)
+            if cached is None:
+                raise ValueError(f"{channel_name}搜索结果第{page}页返回304, 但缓存已被淘汰")
+            logger.info(f"{channel_name}搜索结果第{page}页未变化, 沿用缓存")
+            return cached
+
+        cards, results = parse_pool.run(parse, html, url)
+        search_cache.put(channel_name, keyword, page, url, cards, results, response_headers)
+        return cards, results
+
+    @staticmethod
+    def _post_xpv_search(php_url: str, post_data: dict) -> str:
+        """发送Xpv搜索请求, 返回重定向URL中的搜索ID"""
+        logger.info(f"向Xpv发送视频搜索请求: {php_url}")
+        logger.debug(f"post_data: {post_data}")
+        response = scraper_manager.get_cloud_scraper().post(
+            url=php_url, data=post_data,
+            timeout=5, proxies=PROXIES, verify=sm.settings.get("Check_Cert", DEFAULT_SETTINGS["Check_Cert"])
+        )
+        logger.debug(f"status_code: {response.status_code}")
+        response.raise_for_status()
+
+        redirect_url: str = response.url
+        match = re.search(r'searchid=(\d+)', redirect_url)
+        if not match:
+            raise ValueError(f"无法从重定向URL中提取搜索ID: {redirect_url}")
+        return match.group(1)
+
+    @staticmethod
+    def xpv_search_video(keyword: str, classid: int=21, force_refresh: bool = False) -> list[stru_xpv_video]:
+        """搜索Xpv视频, 获取完所有页面后一起返回, 出错时返回空列表"""
+        video_list: list[stru_xpv_video] = []
+        try:
+            for page_videos in Search_Engine.iter_xpv_search(keyword, classid, force_refresh):
+                video_list.extend(page_videos)
+        except Exception:
+            return []
+        return video_list
 
+    @staticmethod
+    def iter_xpv_search(keyword: str, classid: int=21, force_refresh: bool = False) -> Iterator[list[stru_xpv_video]]:
+        """搜索Xpv视频, 每获取一页就产出该页的视频; 出错时记录日志后抛出异常, 让调用方知道结果不完整"""
+        # 两次搜索之间的间隔由Request_Rate_Rules中的规则保证
         post_data: dict[str, str|int] = {
             "classid": classid,
             "show": "title,text,keyboard,ftitle",
@@ -39,127 +221,95 @@ class Search_Engine:
         }
         base_url = sm.settings.get("Xpv_Hostname", DEFAULT_SETTINGS["Xpv_Hostname"])
         php_url: str = urljoin(base_url, "/e/search/index.php")
+        cache_keyword: str = f"{classid}:{keyword}"
 
         try:
-            logger.info(f"向Xpv发送视频搜索请求: {php_url}")
-            logger.debug(f"post_data: {post_data}")
-            response = scraper_manager.get_cloud_scraper().get_instance().post(
-                url=php_url, data=post_data,
-                timeout=5, proxies=PROXIES, verify=sm.settings.get("Check_Cert", DEFAULT_SETTINGS["Check_Cert"])
-            )
-            logger.debug(f"status_code: {response.status_code}")
-            response.raise_for_status()
-
-            redirect_url: str = response.url
-            match = re.search(r'searchid=(\d+)', redirect_url)
-            if not match:
-                logger.error(f"无法从重定向URL中提取搜索ID: {redirect_url}")
-                return []
-            searchid: str = match.group(1)
-
-            video_list: list[stru_xpv_video] = []
-
-            current_page: int = 0
-            current_video_list = []
-            for _ in range(MAX_PAGE):
-                logger.info(f"获取Xpv搜索结果页面 第{current_page}页: {redirect_url}")
-                target_url = urljoin(base_url, f"/e/search/result/index.php?page={current_page}&searchid={searchid}")
-                response = scraper_manager.get_cloud_scraper().get_instance().get(
-                    url=target_url,
+            # 搜索ID只在有页面需要请求时才获取, 所有页面都命中缓存时不发送搜索请求。缓存的搜索ID只在第一页需要请求时使用:
+            # 失效的搜索ID返回空页, 只有第一页能据此判断失效并重新搜索; 第一页命中缓存时, 后续页面为空分不清是结果到头
+            # 还是搜索ID失效, 因此重新发送搜索请求
+            searchid_lock = threading.Lock()
+            searchid_state: dict[str, str|bool] = {"id": "", "cached": False}
+
+            def get_page_url(page: int) -> str:
+                with searchid_lock:
+                    if not searchid_state["id"]:
+                        searchid: str = search_cache.get_searchid(cache_keyword) if page == 0 else ""
+                        searchid_state["cached"] = bool(searchid)
+                        if not searchid:
+                            searchid = Search_Engine._post_xpv_search(php_url, post_data)
+                            search_cache.put_searchid(cache_keyword, searchid)
+                        searchid_state["id"] = searchid
+                return urljoin(base_url, f"/e/search/result/index.php?page={page}&searchid={searchid_state['id']}")
+
+            def fetch(url: str, headers: dict) -> tuple[int, str, Any]:
+                logger.info(f"获取Xpv搜索结果页面: {url}")
+                response = scraper_manager.get_cloud_scraper().get(
+                    url=url, headers=headers,
                     timeout=7, proxies=PROXIES, verify=sm.settings.get("Check_Cert", DEFAULT_SETTINGS["Check_Cert"])
                 )
                 response.raise_for_status()
+                return response.status_code, response.text, response.headers
 
-                soup: BeautifulSoup = BeautifulSoup(response.text, "html.parser")
-                # 每个视频的div标签
-                current_video_list = soup.find_all("div", class_="col-xs-6 col-sm-4 col-md-3 col-lg-3 list-col col-xl-2")
-                if not current_video_list:
-                    break
-                for div in current_video_list:
-                    # div标签下有a标签, 其中有视频链接(href)和标题(title)
-                    a_tag = div.find("a", href=True)
-                    if a_tag:
-                        href: str = str(a_tag["href"])
-                        title: str = str(a_tag.get("title", ""))
-                        # 提取title中[和]中间的字符串,如果没有则使用unknown
-                        author = re.search(r"\[(.*?)\]", title)
-                        author = author.group(1) if author else "unknown"
-                        # a标签下有img标签, 其中有视频上传日期(隐藏在data-src中,需要加工提取)
-                        # src示例: https://gamezy.xunge.cyou/titlep/2025/1107/3rkmgw2vadq7.jpg 需要提取2025 11 07
-                        img_tag = a_tag.find("img", src=True)
-                        if img_tag:
-                            data_src: str = str(img_tag["data-src"])
-                            match = re.search(r"/(\d{4})/(\d{2})(\d{2})/", data_src)
-                            if match:
-                                year, month, day = match.groups()
-                                updatedAt = f"{year}-{month}-{day}"
-                            else:
-                                updatedAt = ""
-                        else:
-                            updatedAt = ""
-
-                        video_list.append(stru_xpv_video({"title": title, "url": href, "author": author, "furl": target_url, "updatedAt": updatedAt}))
-                if len(current_video_list) < 60:
-                    break
-                current_page += 1
-            else:
-                logger.warning(f"搜索达到上限, 暂停搜索")
-            logger.info(f"成功获取 {len(video_list)} 个视频")
-            return video_list
+            def fetch_page(page: int) -> tuple[int, list[dict]]:
+                try:
+                    cards, results = Search_Engine._get_cached_page(
+                        "Xpv", cache_keyword, page, lambda: get_page_url(page), fetch, parse_xpv_result_cards, force_refresh
+                    )
+                except Exception as e:
+                    if page != 0 or not searchid_state["cached"]:
+                        raise
+                    logger.info(f"缓存的搜索ID请求失败({e})，重新发送搜索请求")
+                else:
+                    if cards or page != 0 or not searchid_state["cached"]:
+                        return cards, results
+                    logger.info(f"缓存的搜索ID没有结果，重新发送搜索请求")
+                # 第一页单独获取, 此时没有其他线程在使用搜索ID
+                search_cache.drop_searchid(cache_keyword)
+                searchid_state.update(id="", cached=False)
+                return Search_Engine._get_cached_page(
+                    "Xpv", cache_keyword, page, lambda: get_page_url(page), fetch, parse_xpv_result_cards, True
+                )
+
+            count: int = 0
+            for page_data in Search_Engine._iter_pages(fetch_page, 0):
+                count += len(page_data)
+                yield [stru_xpv_video(data) for data in page_data]
+            logger.info(f"成功获取 {count} 个视频")
         
         except cloudscraper.exceptions.CloudflareChallengeError as e:
             logger.error(f"Xpv搜索接口返回Cloudflare挑战错误: {e}")
+            raise
         except Exception as e:
             logger.error(f"处理Xpv搜索结果时发生未知错误: {e}")
-        return []
+            raise
 
     @staticmethod
-    def _parse_hanime1_video_items(soup: BeautifulSoup, get_url: str, params: dict) -> list[stru_hanime1_video]:
-        """解析Hanime1搜索结果页面中的视频项
-        
-        Args:
-            soup: BeautifulSoup对象，包含搜索结果页面的HTML
-            get_url: 搜索页面的基础URL
-            params: 当前请求的参数
-            
-        Returns:
-            解析出的视频列表
-        """
-        video_list = []
-        # 查找所有视频项容器，使用select方法提高效率
-        current_video_list = soup.select("div.video-item-container")
-        
-        for div in current_video_list:
-            # div标签本身有标题title, div下的a标签有视频链接href
-            title = str(div.get("title", ""))
-            # 从title中提取author,如果没有则使用unknown
-            author = re.search(r"\[(.*?)\]", title)
-            author = author.group(1) if author else "unknown"
-            a_tag = div.select_one("a[href]")
-            if a_tag and a_tag.has_attr("href"):
-                href = str(a_tag["href"])
-                # 结合get_url和params, 构造完整的视频链接
-                params_string = urlencode(params)
-                furl = f"{get_url}?{params_string}"
-                video_list.append(stru_hanime1_video({"title": title, "url": href, "author": author, "furl": furl}))
-        
-        return video_list
-    
-    @staticmethod
-    def _get_hanime1_page_html(url: str) -> str:
-        """获取Hanime1页面的HTML内容，优先使用cloudscraper，失败则使用dissionpage
+    def _get_hanime1_page(url: str, headers: dict) -> tuple[int, str, Any]:
+        """获取Hanime1页面，优先使用cloudscraper，失败则使用dissionpage
         
         Args:
             url: 要获取的页面URL
+            headers: 条件请求头, 只在cloudscraper通道生效
             
         Returns:
-            页面的HTML内容
+            (状态码, HTML, 响应头)
         """
         # 使用统一的请求方法，自动处理cloudscraper和dissionpage的切换
-        return scraper_manager.get_page_html(url)
+        return scraper_manager.get_page(url, headers)
     
     @staticmethod
-    def hanime1_search_video(keyword: str) -> list[stru_hanime1_video]:
+    def hanime1_search_video(keyword: str, force_refresh: bool = False) -> list[stru_hanime1_video]:
+        """搜索Hanime1视频, 获取完所有页面后一起返回, 出错时返回已获取的页面"""
+        video_list: list[stru_hanime1_video] = []
+        try:
+            for page_videos in Search_Engine.iter_hanime1_search(keyword, force_refresh):
+                video_list.extend(page_videos)
+        except Exception:
+            pass
+        return video_list
+
+    @staticmethod
+    def iter_hanime1_search(keyword: str, force_refresh: bool = False) -> Iterator[list[stru_hanime1_video]]:
         """搜索Hanime1视频，优化后的逻辑
         
         优化点：
@@ -167,6 +317,8 @@ class Search_Engine:
         2. chromium scraper获取HTML后使用bs4处理，不直接定位元素
         3. 简化cloudscraper和chromium scraper的切换逻辑
         4. 统一数据提取逻辑，减少重复代码
+        5. 搜索结果按页缓存, force_refresh为True时忽略未过期的缓存
+        6. 每获取一页就产出该页的视频, 不必等所有页面获取完; 出错时记录日志后抛出异常, 让调用方知道结果不完整
         """
         # query=keyword&type=&genre=&sort=&date=&duration=
         params: dict[str, str|int] = {
@@ -180,47 +332,29 @@ class Search_Engine:
         base_url = sm.settings.get("Hanime1_Hostname", DEFAULT_SETTINGS["Hanime1_Hostname"])
         get_url: str = urljoin(base_url, "/search")
 
-        try:
-            video_list: list[stru_hanime1_video] = []
-            
-            current_page: int = 1
-            for _ in range(MAX_PAGE):
-                params["page"] = current_page
-                logger.info(f"获取Hanime1搜索结果页面 第{current_page}页: {get_url}")
-                logger.debug(f"params: {params}")
-
-                # 构建完整的请求URL
-                full_url = f"{get_url}?{urlencode(params)}"
-                
-                try:
-                    # 获取页面HTML
-                    html = Search_Engine._get_hanime1_page_html(full_url)
-                    
-                    # 使用bs4解析HTML
-                    soup = BeautifulSoup(html, "html.parser")
-                    
-                    # 解析视频项
-                    parsed_videos = Search_Engine._parse_hanime1_video_items(soup, get_url, params)
-                    video_list.extend(parsed_videos)
-                    
-                    # 检查是否还有更多页面
-                    if len(parsed_videos) < 60:
-                        logger.info(f"当前页只获取到 {len(parsed_videos)} 个视频，停止搜索")
-                        break
-                    
-                    current_page += 1
-                except Exception as e:
-                    logger.error(f"处理页面失败: {e}")
-                    break
-            else:
-                logger.warning(f"搜索达到上限, 暂停搜索")
-            
-            logger.info(f"成功获取 {len(video_list)} 个视频")
-            return video_list
+        def get_page_url(page: int) -> str:
+            page_params: dict[str, str|int] = dict(params, page=page)
+            logger.info(f"获取Hanime1搜索结果页面 第{page}页: {get_url}")
+            logger.debug(f"params: {page_params}")
+            # 构建完整的请求URL
+            return f"{get_url}?{urlencode(page_params)}"
 
+        def fetch_page(page: int) -> tuple[int, list[dict]]:
+            return Search_Engine._get_cached_page(
+                "Hanime1", keyword, page, lambda: get_page_url(page), Search_Engine._get_hanime1_page,
+                parse_hanime1_result_cards, force_refresh
+            )
+
+        count: int = 0
+        try:
+            for page_data in Search_Engine._iter_pages(fetch_page, 1):
+                count += len(page_data)
+                yield [stru_hanime1_video(data) for data in page_data]
         except Exception as e:
-            logger.error(f"处理Hanime1搜索结果时发生未知错误: {e}")
-        return []
+            logger.error(f"处理页面失败: {e}")
+            raise
+        
+        logger.info(f"成功获取 {count} 个视频")
 
 # 注册搜索渠道到渠道管理器
 def register_search_channels():
@@ -233,10 +367,11 @@ def register_search_channels():
         hostname_key="Xpv_Hostname",
         download_path_key="Xpv_Download_Path",
         search_method=Search_Engine.xpv_search_video,
-        download_methods={
-            "default": Download_Engine.xpv_download_video,
-            "pic": Download_Engine.xpv_download_comic_pic,
-            "video": Download_Engine.xpv_download_community_video
+        search_pages_method=Search_Engine.iter_xpv_search,
+        resolve_methods={
+            "default": Download_Engine.xpv_resolve_video,
+            "pic": Download_Engine.xpv_resolve_comic_pic,
+            "video": Download_Engine.xpv_resolve_community_video
         },
         video_struc=stru_xpv_video,
     )
@@ -248,8 +383,9 @@ def register_search_channels():
         hostname_key="Hanime1_Hostname",
         download_path_key="Hanime1_Download_Path",
         search_method=Search_Engine.hanime1_search_video,
-        download_methods={
-            "default": Download_Engine.hanime1_download
+        search_pages_method=Search_Engine.iter_hanime1_search,
+        resolve_methods={
+            "default": Download_Engine.hanime1_resolve
         },
         video_struc=stru_hanime1_video,
     )
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import logging
+import threading
+from contextlib import ExitStack
+from urllib.parse import urlparse
+
+import yt_dlp
+
+from ..utils.Concurrency_Governor import concurrency_governor
+from ..utils.Logger import get_logger
+from ..utils.Rate_Limiter import bandwidth_limiter, request_limiter
+
+logger: logging.Logger = get_logger("yt_dlp池")
+
+
+class YoutubeDL_Pool:
+    """yt_dlp实例池
+
+    每个下载线程按配置哈希缓存长期存活的YoutubeDL实例, 避免每个视频都重新初始化提取器、
+    cookie和HTTP连接。每个任务只覆盖outtmpl。解析阶段用extract_info只提取信息, 传输阶段再用
+    process_ie_result下载。下载进度通过钩子上报给带宽限制器, 限速调整后立即生效
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._instances: list[yt_dlp.YoutubeDL] = []
+
+    @staticmethod
+    def _options_key(ydl_opts: dict) -> str:
+        """计算配置的哈希, 作为实例的键"""
+        return hashlib.sha1(json.dumps(ydl_opts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _thread_instances(self) -> dict[str, yt_dlp.YoutubeDL]:
+        instances = getattr(self._local, "instances", None)
+        if instances is None:
+            instances = {}
+            self._local.instances = instances
+        return instances
+
+    def get(self, ydl_opts: dict) -> yt_dlp.YoutubeDL:
+        """获取当前线程下与配置对应的YoutubeDL实例, 不存在则创建
+
+        Args:
+            ydl_opts: yt_dlp参数, 不应包含outtmpl
+
+        Returns:
+            YoutubeDL实例
+        """
+        instances = self._thread_instances()
+        key = YoutubeDL_Pool._options_key(ydl_opts)
+        ydl = instances.get(key)
+        if ydl is None:
+            logger.debug(f"为线程 {threading.current_thread().name} 创建YoutubeDL实例: {key[:8]}")
+            ydl = yt_dlp.YoutubeDL(dict(ydl_opts))  # pyright: ignore[reportArgumentType]
+            ydl.add_progress_hook(self._progress_hook)
+            instances[key] = ydl
+            with self._lock:
+                self._instances.append(ydl)
+        return ydl
+
+    def _progress_hook(self, status: dict) -> None:
+        """yt_dlp在下载线程中同步调用, 在这里阻塞即可限速"""
+        filename: str = status.get("tmpfilename") or status.get("filename", "")
+        last_bytes: dict[str, int] = self._local.last_bytes
+        if status.get("status") == "downloading":
+            downloaded: int = status.get("downloaded_bytes") or 0
+            delta = downloaded - last_bytes.get(filename, 0)
+            last_bytes[filename] = downloaded
+            if delta > 0:
+                bandwidth_limiter.throttle(self._local.channel_name, delta)
+        else:
+            last_bytes.pop(filename, None)
+
+    def extract_info(self, ydl_opts: dict, url: str) -> dict:
+        """只提取信息不下载, 供解析阶段使用, 失败时抛出异常
+
+        Args:
+            ydl_opts: yt_dlp参数, 不应包含outtmpl
+            url: 页面或媒体URL
+
+        Returns:
+            已选好格式的信息字典, 交给download下载
+        """
+        ydl = self.get(ydl_opts)
+        request_limiter.wait("GET", url)
+        try:
+            with concurrency_governor.slot(url):
+                info = ydl.extract_info(url, download=False)
+        except Exception:
+            self._discard(ydl_opts)
+            raise
+        if not info:
+            raise ValueError(f"yt_dlp未能提取信息: {url}")
+        return info
+
+    def download(self, ydl_opts: dict, outtmpl: str, info: dict, channel_name: str = "") -> None:
+        """使用池中的实例下载extract_info得到的信息, 失败时抛出异常
+
+        Args:
+            ydl_opts: yt_dlp参数, 不应包含outtmpl
+            outtmpl: 本次任务的保存路径模板
+            info: extract_info的结果, 可以来自其他线程
+            channel_name: 所属渠道, 用于渠道限速
+        """
+        ydl = self.get(ydl_opts)
+        self._local.channel_name = channel_name
+        self._local.last_bytes = {}
+        # YoutubeDL初始化时已把outtmpl规范化为字典
+        ydl.params["outtmpl"]["default"] = outtmpl
+        try:
+            with ExitStack() as stack:
+                # 整个下载过程占用媒体所在各主机的一个并发名额, 不占用页面所在主机的名额, 以免长时间阻塞搜索和解析;
+                # 按主机名顺序获取, 避免多个线程互相等待
+                for url in YoutubeDL_Pool._media_urls(info):
+                    concurrency_governor.mark_media_host(url)
+                    stack.enter_context(concurrency_governor.slot(url))
+                ydl.process_ie_result(info, download=True)
+        except Exception:
+            # 出错的实例状态不可信, 丢弃后下次重建
+            self._discard(ydl_opts)
+            raise
+
+    @staticmethod
+    def _media_urls(info: dict) -> list[str]:
+        """取出将要下载的媒体URL, 每个主机一个; 合并格式没有顶层url, 从requested_formats中取视频和音频的URL"""
+        formats: list[dict] = info.get("requested_formats") or [info]
+        hosts: dict[str, str] = {}
+        for media in formats:
+            url: str = media.get("url", "")
+            if url:
+                hosts.setdefault(urlparse(url).netloc, url)
+        return [hosts[host] for host in sorted(hosts)]
+
+    def _discard(self, ydl_opts: dict) -> None:
+        ydl = self._thread_instances().pop(YoutubeDL_Pool._options_key(ydl_opts), None)
+        if ydl is None:
+            return
+        with self._lock:
+            if ydl in self._instances:
+                self._instances.remove(ydl)
+        try:
+            ydl.close()
+        except Exception as e:
+            logger.warning(f"关闭YoutubeDL实例失败: {e}")
+
+    def close(self) -> None:
+        """关闭所有实例"""
+        with self._lock:
+            instances, self._instances = self._instances, []
+        logger.info(f"关闭 {len(instances)} 个YoutubeDL实例")
+        for ydl in instances:
+            try:
+                ydl.close()
+            except Exception as e:
+                logger.warning(f"关闭YoutubeDL实例失败: {e}")
+
+
+# 创建全局yt_dlp实例池
+ytdl_pool = YoutubeDL_Pool()
@@ -1,6 +1,5 @@
 import logging
 import os
-import queue
 import re
 import subprocess
 import threading
@@ -14,9 +13,13 @@ from ttkbootstrap.dialogs.dialogs import Messagebox
 from ..config.Init_Settings import *
 from ..core.Channel import channel_manager, Channel
 from ..core.Custom_Struc import *
+from ..core.Download_Journal import Download_Journal
+from ..core.Download_Pipeline import Download_Pipeline
+from ..core.Download_Queue import Download_Queue, PRIORITY_BULK, PRIORITY_UPDATE, PRIORITY_USER
 from ..core.Search_Engine import Search_Engine
 from ..config.Settings_Manager import sm, cm
 from ..utils.Logger import get_logger
+from ..utils.Rate_Limiter import bandwidth_limiter
 
 logger: logging.Logger = get_logger("⭐Iwaratown⭐")
 
@@ -83,11 +86,12 @@ class Window_Settings(tb.Toplevel):
         super().__init__() # --- Modified Code: Correctly initialize Toplevel ---
         self.master = master
         self.title("设置")
-        self.geometry("800x550")
+        self.geometry("800x700")
         # 存储动态创建的控件
         self.hostname_entries: dict[str, tb.Entry] = {}
         self.api_hostname_entries: dict[str, tb.Entry] = {}
         self.download_path_entries: dict[str, tb.Entry] = {}
+        self.bandwidth_limit_entries: dict[str, tb.Entry] = {}
         self.create_widgets()
         self.fill_entry()
 
@@ -120,6 +124,14 @@ class Window_Settings(tb.Toplevel):
             entry_path.pack(side='left', padx=5)
             tb.Button(frame_path, text="浏览", command=lambda entry=entry_path: self.browse_directory(entry)).pack(side='left')
             self.download_path_entries[channel_name] = entry_path
+
+            # 创建渠道限速设置
+            frame_bandwidth = tb.Frame(self)
+            frame_bandwidth.pack(anchor=tk.NW, pady=5, padx=10)
+            tb.Label(frame_bandwidth, text=f"{channel_name}限速(KB/s, 0为不限):").pack(side='left')
+            entry_bandwidth = tb.Entry(frame_bandwidth, width=10)
+            entry_bandwidth.pack(side='left', padx=5)
+            self.bandwidth_limit_entries[channel_name] = entry_bandwidth
         
         # 自定义下载路径
         frame_custom_path = tb.Frame(self)
@@ -136,6 +148,13 @@ class Window_Settings(tb.Toplevel):
         self.entry_max_threads = tb.Entry(frame_max_threads, width=5)
         self.entry_max_threads.pack(side='left', padx=5)
 
+        # 全局限速
+        frame_bandwidth_limit = tb.Frame(self)
+        frame_bandwidth_limit.pack(anchor=tk.NW, pady=5, padx=10)
+        tb.Label(frame_bandwidth_limit, text="全局限速(KB/s, 0为不限):").pack(side='left')
+        self.entry_bandwidth_limit = tb.Entry(frame_bandwidth_limit, width=10)
+        self.entry_bandwidth_limit.pack(side='left', padx=5)
+
         # 检查证书
         frame_check_cert = tb.Frame(self)
         frame_check_cert.pack(anchor=tk.NW, pady=5, padx=10)
@@ -172,11 +191,17 @@ class Window_Settings(tb.Toplevel):
             if channel_name in self.download_path_entries:
                 download_path_key = config["download_path_key"]
                 self.download_path_entries[channel_name].insert(0, sm.settings.get(download_path_key, DEFAULT_SETTINGS[download_path_key]))
+
+            # 填充渠道限速
+            if channel_name in self.bandwidth_limit_entries:
+                channel_limits: dict = sm.settings.get("Channel_Bandwidth_Limit", DEFAULT_SETTINGS["Channel_Bandwidth_Limit"])
+                self.bandwidth_limit_entries[channel_name].insert(0, str(channel_limits.get(channel_name, 0)))
         
         # 填充通用设置
         self.entry_custom_path.insert(0, sm.settings.get("Custom_Download_Path", DEFAULT_SETTINGS["Custom_Download_Path"]))
         self.entry_max_threads.insert(0, str(sm.settings.get("Max_Threads", DEFAULT_SETTINGS["Max_Threads"])))
         self.check_cert_var.set(sm.settings.get("Check_Cert", DEFAULT_SETTINGS["Check_Cert"]))
+        self.entry_bandwidth_limit.insert(0, str(sm.settings.get("Bandwidth_Limit", DEFAULT_SETTINGS["Bandwidth_Limit"])))
 
     def on_close(self) -> None:
         # 保存每个频道的设置
@@ -205,10 +230,25 @@ class Window_Settings(tb.Toplevel):
             if not 1 <= max_threads <= 32:
                 raise ValueError("线程数必须在 1-32 之间")
             sm.settings["Max_Threads"] = max_threads
-            sm.save_settings()
-            self.destroy()
         except ValueError as e:
             logger.error(f"无效的线程数输入: {e}")
+            return
+
+        try:
+            bandwidth_limit = int(self.entry_bandwidth_limit.get())
+            channel_limits = {channel_name: int(entry.get()) for channel_name, entry in self.bandwidth_limit_entries.items()}
+            if bandwidth_limit < 0 or any(limit < 0 for limit in channel_limits.values()):
+                raise ValueError("限速不能为负数")
+            sm.settings["Bandwidth_Limit"] = bandwidth_limit
+            sm.settings["Channel_Bandwidth_Limit"] = channel_limits
+        except ValueError as e:
+            logger.error(f"无效的限速输入: {e}")
+            return
+
+        sm.save_settings()
+        # 限速立即生效, 不需要重启下载线程
+        bandwidth_limiter.reload()
+        self.destroy()
 
 class Window_CheckUpdate(tb.Toplevel):
     """检查更新窗口，用于显示未下载的新视频"""
@@ -320,7 +360,7 @@ class Window_CheckUpdate(tb.Toplevel):
             # 将选中的视频添加到队列中
             self.master.progressbar.configure(maximum=len(selected_videos), value=0)
             for video in selected_videos:
-                self.master.download_queue.put(video)
+                self.master.download_queue.put(video, PRIORITY_UPDATE)
 
             logger.info(f"已将 {len(selected_videos)} 个视频添加到下载队列")
             Messagebox.show_info(f"已将 {len(selected_videos)} 个视频添加到下载队列", "提示", parent=self)
@@ -576,9 +616,11 @@ class Win_Main(tb.Window):
         self.video_list: list[stru_xpv_video|stru_hanime1_video] = []
         self.url_for_edge_to_open: str = ""
         self.current_author: str = ""
+        # 每次搜索加一, 用来丢弃过时搜索的结果页
+        self.search_generation: int = 0
 
-        self.download_queue: queue.Queue[stru_xpv_video|stru_xpv_custom|stru_hanime1_video] = queue.Queue()
-        self.download_threads: list[threading.Thread] = []
+        self.download_queue: Download_Queue = Download_Queue(Download_Journal())
+        self.download_pipeline: Download_Pipeline = Download_Pipeline(self.download_queue, self._on_download_success)
 
         self.col_map: dict[str, str] = {
             "#1": "date",
@@ -589,29 +631,20 @@ class Win_Main(tb.Window):
         self.sort_col: str = "#1"
         self.sort_reverse: bool = False
 
-        self._init_download_workers()
+        self.download_pipeline.start()
         self.create_widgets()
+        self._restore_download_queue()
     
-    def _init_download_workers(self) -> None:
-        for _ in range(sm.settings.get("Max_Threads", DEFAULT_SETTINGS["Max_Threads"])):
-            thread: threading.Thread = threading.Thread(target=self._download_worker, daemon=True)
-            self.download_threads.append(thread)
-            thread.start()
+    def _restore_download_queue(self) -> None:
+        """恢复上次退出时未完成的下载任务"""
+        restored: int = self.download_queue.restore()
+        if restored:
+            self.progressbar.configure(maximum=restored, value=0)
     
-    def _download_worker(self) -> None:
-        logger.debug(f"下载线程启动: {threading.current_thread().name}")
-        while True:
-            #这里的get会自动断点
-            task: stru_xpv_video|stru_xpv_custom|stru_hanime1_video = self.download_queue.get()
-            logger.info(f"队列还剩下{self.download_queue.qsize()}个任务")
-            
-            # 使用渠道管理器下载任务
-            success: bool = channel_manager.download(task)
-            
-            if success:
-                self.after(0, self.update_tree)
-                self.after(0, self.progressbar.step, 1)
-            self.download_queue.task_done()
+    def _on_download_success(self, task: stru_xpv_video|stru_xpv_custom|stru_hanime1_video) -> None:
+        """传输线程中调用, 回到主线程刷新界面"""
+        self.after(0, self.update_tree)
+        self.after(0, self.progressbar.step, 1)
 
     def create_widgets(self) -> None:
         frame_toolbar = tb.Frame(self)
@@ -662,6 +695,8 @@ class Win_Main(tb.Window):
         self.combobox_source.pack(side='left', padx=5)
         self.btn_search = tb.Button(frame_search, text="搜索", command=self.start_search)
         self.btn_search.pack(side='left', padx=5)
+        # 忽略搜索缓存, 重新获取所有页面
+        tb.Button(frame_search, text="刷新", command=lambda: self.start_search(force_refresh=True)).pack(side='left', padx=5)
         tb.Button(frame_search, text="下载", command=self.start_download).pack(side='left', padx=5)
 
         frame_list = tb.Frame(self)
@@ -707,15 +742,35 @@ class Win_Main(tb.Window):
         
         # 插入新项
         for video in self.video_list:
-            video_path: str = os.path.join(video.dpath, video.savetitle + ".mp4")
-
-            self.tree.insert('', 'end', values=(
-                video.updatedAt, 
-                video.title, "已下载" if os.path.isfile(video_path) else "未下载", 
-                "打开链接",
-                video.numViews))
+            self._insert_tree_row(video)
         logger.debug(f"更新Treeview显示 共 {len(self.video_list)} 条记录")
 
+    def _insert_tree_row(self, video) -> None:
+        video_path: str = os.path.join(video.dpath, video.savetitle + ".mp4")
+
+        self.tree.insert('', 'end', values=(
+            video.updatedAt, 
+            video.title, "已下载" if os.path.isfile(video_path) else "未下载", 
+            "打开链接",
+            video.numViews))
+
+    def append_tree(self, videos: list, generation: int) -> None:
+        """在主线程中把搜索到的一页视频追加到Treeview"""
+        if generation != self.search_generation or not videos:
+            return
+        if not self.video_list:
+            # 第一页到达时即可打开网页和本地文件夹
+            self.current_author = videos[0].author
+            self.url_for_edge_to_open = getattr(videos[0], 'furl', '')
+            self.selected_author = getattr(videos[0], 'author', '')
+            if self.url_for_edge_to_open:
+                self.btn_edge.configure(state=tk.NORMAL)
+            self.btn_local.configure(state=tk.NORMAL)
+        self.video_list.extend(videos)
+        for video in videos:
+            self._insert_tree_row(video)
+        logger.debug(f"追加 {len(videos)} 条记录 共 {len(self.video_list)} 条")
+
     def on_tree_click(self, event) -> None:
         # 获取点击位置的行和列
         col: str = self.tree.identify_column(event.x)
@@ -777,7 +832,7 @@ class Win_Main(tb.Window):
         except Exception as e:
             logger.error(f"打开本地文件夹失败: {e}")
 
-    def start_search(self) -> None:
+    def start_search(self, force_refresh: bool = False) -> None:
         keyword: str = self.entry_search.get().strip()
         source: str = self.combobox_source.get()
         if not keyword:
@@ -787,29 +842,24 @@ class Win_Main(tb.Window):
         self.btn_edge.config(state=tk.DISABLED)
         self.btn_local.config(state=tk.DISABLED)
         self.tree.delete(*self.tree.get_children())
-        threading.Thread(target=self._perform_search, args=(keyword, source), daemon=True).start()
+        self.video_list = []
+        # 新的搜索开始后丢弃上一次搜索还没显示的页面
+        self.search_generation += 1
+        threading.Thread(target=self._perform_search, args=(keyword, source, force_refresh, self.search_generation),
+                         daemon=True).start()
 
-    def _perform_search(self, keyword: str, source: str) -> None:
+    def _perform_search(self, keyword: str, source: str, force_refresh: bool = False, generation: int = 0) -> None:
         """Executes the search operation in a background thread."""
         try:
             if source in channel_manager.list_channels():
-                # 使用渠道管理器进行搜索
-                self.video_list = channel_manager.search(keyword, source)
-                if not self.video_list:
-                    return
-                # 安全地获取第一个视频的furl属性
-                self.url_for_edge_to_open = getattr(self.video_list[0], 'furl', '')
-                self.selected_author = getattr(self.video_list[0], 'author', '')
+                # 使用渠道管理器逐页搜索, 每获取一页就显示一页
+                for page_videos in channel_manager.iter_search(keyword, source, force_refresh):
+                    if generation != self.search_generation:
+                        # 已经开始了新的搜索, 停止获取剩余页面
+                        break
+                    self.after(0, self.append_tree, page_videos, generation)
             else:
                 logger.warning(f"未知的来源: {source}")
-                self.video_list = []
-            
-            if self.url_for_edge_to_open:
-                self.after(0, lambda: self.btn_edge.configure(state=tk.NORMAL))
-            self.after(0, lambda: self.btn_local.configure(state=tk.NORMAL))
-
-            if self.video_list:
-                self.after(0, self.update_tree)
 
         except Exception as e:
             logger.error(f"搜索时发生未知错误: {e}")
@@ -831,16 +881,18 @@ class Win_Main(tb.Window):
         self.progressbar.configure(maximum=len(selected_items), value=0)
 
         logger.info(f"开始下载 {len(selected_items)} 个视频到: {download_path} ")
+        # 只选了一个视频视为用户单独发起, 多选视为批量下载
+        priority: int = PRIORITY_USER if len(selected_items) == 1 else PRIORITY_BULK
         for i, item_id in enumerate(selected_items):
             video_data: stru_xpv_video|stru_hanime1_video = self.video_list[selected_videos_indices[i]]
-            self.download_queue.put(video_data)
+            self.download_queue.put(video_data, priority)
 
     def start_download_custom(self) -> None:
         custom_url: str = self.entry_custom_url.get().strip()
         if not custom_url:
             self.after(0, lambda: Messagebox.show_warning("请输入自定义URL", "提示"))
             return
-        self.download_queue.put(stru_xpv_custom(data={"url": custom_url}))
+        self.download_queue.put(stru_xpv_custom(data={"url": custom_url}), PRIORITY_USER)
 
     def dumpfunction_update_old_title_video(self) -> None:
         quantity: int = 0
@@ -886,8 +938,8 @@ class Win_Main(tb.Window):
             # 使用单个线程依次访问每个作者
             for author in hanime1_authors:
                 logger.info(f"检查作者 {author} 的更新")
-                # 获取该作者的所有视频
-                videos = Search_Engine.hanime1_search_video(author)
+                # 获取该作者的所有视频, 检查更新要看到最新结果, 忽略搜索缓存
+                videos = Search_Engine.hanime1_search_video(author, force_refresh=True)
                 
                 if videos:
                     # 从最新的视频开始检索，直到找到已经下载过的视频
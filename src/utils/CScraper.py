@@ -1,30 +1,212 @@
+import json
 import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional, TypeVar
+from urllib.parse import urljoin, urlparse
 
 from bs4 import BeautifulSoup
 import cloudscraper
+from cloudscraper import CipherSuiteAdapter
 from DrissionPage import ChromiumOptions, ChromiumPage
+from requests.adapters import HTTPAdapter
 
-from ..config.Init_Settings import HANIME1_ELEMENTS
+from ..config.Init_Settings import (DEFAULT_SETTINGS, HANIME1_ELEMENTS, HTTP_POOL_HOSTS, SESSION_FILE,
+                                    SESSION_STRATEGY_TTL)
+from ..config.Settings_Manager import sm
+from ..utils.Concurrency_Governor import concurrency_governor
+from ..utils.Html_Parser import parse_html
 from ..utils.Logger import get_logger
+from ..utils.Rate_Limiter import request_limiter
+from ..utils.Retry_Engine import RETRYABLE_ERRORS, classify_error, classify_status, parse_retry_after, retry_policy
 
 logger: logging.Logger = get_logger("爬虫管理器")
 
+T = TypeVar("T")
+
+# 各主机的访问方式
+STRATEGY_CLOUDSCRAPER: str = "cloudscraper"
+STRATEGY_CHROMIUM: str = "chromium"
+
 
 class CloudScraper:
-    """CloudScraper类，专门处理cloudscraper相关功能"""
+    """CloudScraper类，专门处理cloudscraper相关功能
+
+    requests会话不是线程安全的, 每次请求从会话池借出一个会话, 收到响应后归还。所有会话共用同一个
+    cookie容器和请求头(cf_clearance和User-Agent一处更新处处生效), 也共用同一组连接适配器,
+    同一主机的长连接在所有线程之间复用
+    """
     
     def __init__(self):
         """初始化CloudScraper实例"""
-        self.scraper = cloudscraper.create_scraper(
+        self.scraper = self._create_session()
+        self._adapters: dict[str, HTTPAdapter] = self._create_adapters()
+        self._mount_adapters(self.scraper)
+        self._lock = threading.Lock()
+        # 空闲会话, 后进先出
+        self._idle: list = [self.scraper]
+        self._session_count: int = 1
+    
+    def _create_session(self, sess=None):
+        """创建cloudscraper会话, 传入sess时共用它的cookie、请求头等状态"""
+        return cloudscraper.create_scraper(
+            sess=sess,
             browser={
                 'browser': 'chrome',
                 'platform': 'windows',
                 'desktop': True,
                 'mobile': False,
                 'version': '142.0.0.0'
-            }
+            },
+            # 与主会话的User-Agent保持相同的TLS指纹
+            cipherSuite=sess.cipherSuite if sess is not None else None
         )
     
+    def _create_adapters(self) -> dict[str, HTTPAdapter]:
+        """按配置的并发数创建共用的连接适配器, 每个主机最多保留的长连接数与可能同时访问它的线程数一致"""
+        def get(key: str) -> int:
+            return max(1, int(sm.settings.get(key, DEFAULT_SETTINGS[key])))
+        pool_maxsize: int = (get("Max_Threads") * get("Download_Segments") + get("Image_Threads")
+                             + get("Resolve_Threads"))
+        logger.debug(f"HTTP连接池: 最多{HTTP_POOL_HOSTS}个主机, 每个主机{pool_maxsize}个连接")
+        # 不阻塞: 并发已经由并发控制器限制, 超出时临时新建连接, 用完即关闭
+        return {
+            "https://": CipherSuiteAdapter(
+                cipherSuite=self.scraper.cipherSuite,
+                ecdhCurve=self.scraper.ecdhCurve,
+                pool_connections=HTTP_POOL_HOSTS,
+                pool_maxsize=pool_maxsize,
+                pool_block=False
+            ),
+            "http://": HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=pool_maxsize, pool_block=False),
+        }
+    
+    def _mount_adapters(self, session) -> None:
+        for prefix, adapter in self._adapters.items():
+            session.mount(prefix, adapter)
+    
+    def _acquire_session(self):
+        """借出一个空闲会话, 没有空闲的就新建"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            self._session_count += 1
+        session = self._create_session(self.scraper)
+        self._mount_adapters(session)
+        return session
+    
+    def _release_session(self, session) -> None:
+        with self._lock:
+            self._idle.append(session)
+    
+    def pool_stats(self) -> dict:
+        """
+        连接复用统计, 只统计仍保留在连接池中的主机
+        
+        Returns:
+            sessions: 会话数, pools: 主机连接池数, requests: 请求数,
+            hits: 复用已有连接的请求数, misses: 新建连接数
+        """
+        requests_count: int = 0
+        connections: int = 0
+        pools: int = 0
+        for adapter in self._adapters.values():
+            manager_pools = adapter.poolmanager.pools
+            for key in list(manager_pools.keys()):
+                pool = manager_pools.get(key)
+                if pool is None:
+                    continue
+                pools += 1
+                requests_count += pool.num_requests
+                connections += pool.num_connections
+        return {
+            "sessions": self._session_count,
+            "pools": pools,
+            "requests": requests_count,
+            "hits": max(0, requests_count - connections),
+            "misses": connections,
+        }
+    
+    def request(self, method: str, url: str, **kwargs):
+        """
+        发送请求, 超时、连接中断、429和5xx按退避策略自动重试, Cloudflare挑战和其他错误不重试
+        
+        Args:
+            method: 请求方法
+            url: 请求URL
+            **kwargs: 传给requests的参数
+            
+        Returns:
+            Response对象, 重试次数用完时返回最后一次的响应
+        """
+        max_attempts: int = 1 + int(sm.settings.get("Request_Retries", DEFAULT_SETTINGS["Request_Retries"]))
+        attempt: int = 0
+        while True:
+            attempt += 1
+            try:
+                response = self._request_once(method, url, **kwargs)
+            except Exception as e:
+                error_class = classify_error(e)
+                if error_class not in RETRYABLE_ERRORS or attempt >= max_attempts:
+                    raise
+                delay = retry_policy.get_delay(attempt, error_class)
+                logger.warning(f"请求出错({error_class}): {e}, {delay:.1f}秒后第{attempt}次重试: {url}")
+                time.sleep(delay)
+                continue
+            
+            if response.status_code < 400 or attempt >= max_attempts:
+                return response
+            error_class = classify_status(response)
+            if error_class not in RETRYABLE_ERRORS:
+                return response
+            delay = retry_policy.get_delay(attempt, error_class, parse_retry_after(response))
+            logger.warning(f"请求返回{response.status_code}({error_class}), {delay:.1f}秒后第{attempt}次重试: {url}")
+            response.close()
+            time.sleep(delay)
+    
+    def _request_once(self, method: str, url: str, **kwargs):
+        """
+        发送一次请求, 先等待请求频率限制, 再向并发控制器申请所在主机的名额
+        
+        Returns:
+            Response对象, stream=True时名额在response.close()时释放
+        """
+        # 在申请名额之前等待, 避免等待期间占着名额
+        request_limiter.wait(method, url)
+        slot = concurrency_governor.acquire(url)
+        # 会话只在发送请求、处理挑战和写入cookie期间借用; 流式响应的连接属于共用的连接池, 不占用会话
+        session = self._acquire_session()
+        try:
+            response = session.request(method, url, **kwargs)
+        except BaseException as e:
+            slot.release(e)
+            raise
+        finally:
+            self._release_session(session)
+        slot.record_response(response)
+        if kwargs.get("stream"):
+            # 流式响应在读完正文前仍占用连接, 关闭时才释放名额
+            close = response.close
+            def close_and_release() -> None:
+                try:
+                    close()
+                finally:
+                    slot.release()
+            response.close = close_and_release
+        else:
+            slot.release()
+        return response
+    
+    def get(self, url: str, **kwargs):
+        """发送GET请求"""
+        return self.request("GET", url, **kwargs)
+    
+    def post(self, url: str, **kwargs):
+        """发送POST请求"""
+        return self.request("POST", url, **kwargs)
+    
     def get_soup(self, url: str, timeout: int = 10) -> BeautifulSoup:
         """
         使用cloudscraper获取网页soup对象
@@ -37,9 +219,9 @@ class CloudScraper:
             BeautifulSoup对象
         """
         logger.info(f"使用cloudscraper爬取: {url}")
-        response = self.scraper.get(url, timeout=timeout)
+        response = self.get(url, timeout=timeout)
         response.raise_for_status()
-        return BeautifulSoup(response.text, "html.parser")
+        return parse_html(response.text)
     
     def get_response(self, url: str, timeout: int = 10):
         """
@@ -53,11 +235,213 @@ class CloudScraper:
             Response对象
         """
         logger.info(f"使用cloudscraper获取响应: {url}")
-        return self.scraper.get(url, timeout=timeout)
+        return self.get(url, timeout=timeout)
     
     def get_instance(self):
-        """获取底层cloudscraper实例"""
+        """获取底层cloudscraper实例(主会话), 只应用于读取或修改共用的cookie和请求头"""
         return self.scraper
+    
+    def import_browser_session(self, cookies: list[dict], user_agent: str) -> None:
+        """
+        导入浏览器通过Cloudflare挑战后的cookie和User-Agent, cf_clearance只对签发时的UA有效
+        
+        Args:
+            cookies: 浏览器的cookie列表, 每项包含name、value、domain、path, 可选expires(Unix时间戳)
+            user_agent: 浏览器的User-Agent
+        """
+        for cookie in cookies:
+            expires = cookie.get("expires")
+            self.scraper.cookies.set(cookie["name"], cookie["value"],
+                                     domain=cookie.get("domain", ""), path=cookie.get("path", "/"),
+                                     # 浏览器用-1表示会话cookie
+                                     expires=int(expires) if expires and expires > 0 else None)
+        if user_agent:
+            self.scraper.headers["User-Agent"] = user_agent
+    
+    def export_session(self) -> tuple[list[dict], str]:
+        """
+        导出共用的cookie和User-Agent, 格式与import_browser_session相同
+        
+        Returns:
+            (未过期的cookie列表, User-Agent)
+        """
+        now: float = time.time()
+        cookies: list[dict] = [
+            {"name": cookie.name, "value": cookie.value, "domain": cookie.domain, "path": cookie.path,
+             "expires": cookie.expires}
+            for cookie in list(self.scraper.cookies)
+            if cookie.expires is None or cookie.expires > now
+        ]
+        return cookies, self.scraper.headers.get("User-Agent", "")
+
+
+class Chromium_Broker:
+    """Chromium标签页池
+
+    只启动一个浏览器, 预先打开Chromium_Tabs个标签页轮流使用, 同时进行的浏览器任务不超过标签页数,
+    多出的任务排队等待。标签页导航Chromium_Tab_Recycle次后关闭重开, 整个浏览器导航
+    Chromium_Browser_Recycle次后等所有标签页归还再重启, 限制内存增长
+    """
+    
+    def __init__(self):
+        self.browser: ChromiumPage = None  # pyright: ignore[reportAttributeAccessIssue]
+        self._cond = threading.Condition()
+        self._idle: list = []
+        self._in_use: int = 0
+        # 各标签页的导航次数, 以tab_id为键
+        self._tab_navigations: dict[str, int] = {}
+        self._browser_navigations: int = 0
+        self._restart_pending: bool = False
+        # 浏览器每次创建加一; 记录各标签页创建时的浏览器代数, 以tab_id为键
+        self._generation: int = 0
+        self._tab_generations: dict[str, int] = {}
+        # 每次导航成功后调用, 参数为标签页和URL
+        self.on_navigated: Optional[Callable[[Any, str], None]] = None
+    
+    def _settings(self, key: str) -> int:
+        return max(1, int(sm.settings.get(key, DEFAULT_SETTINGS[key])))
+    
+    def _create_browser(self) -> None:
+        logger.info("初始化dissionpage")
+        co = ChromiumOptions().auto_port()
+        co.incognito(True)
+        self.browser = ChromiumPage(co)
+        self.browser.set.window.size(600, 300)
+        self._generation += 1
+        self._browser_navigations = 0
+        self._tab_navigations = {}
+        # 预热标签页, 主页面本身只用来维持浏览器, 不参与轮转
+        self._idle = [self._new_tab() for _ in range(self._settings("Chromium_Tabs"))]
+        logger.info(f"预热了 {len(self._idle)} 个标签页")
+    
+    def _new_tab(self):
+        tab = self.browser.new_tab()
+        self._tab_navigations[tab.tab_id] = 0
+        self._tab_generations[tab.tab_id] = self._generation
+        return tab
+    
+    def _is_stale(self, tab) -> bool:
+        """标签页是否属于已经退出或重建前的浏览器"""
+        return self._tab_generations.get(tab.tab_id) != self._generation
+    
+    def _close_tab(self, tab) -> None:
+        self._tab_navigations.pop(tab.tab_id, None)
+        self._tab_generations.pop(tab.tab_id, None)
+        try:
+            tab.close()
+        except Exception:
+            pass
+    
+    def _ensure_browser(self) -> None:
+        """延迟启动浏览器, 连接断开时重建, 调用时需持有锁"""
+        if self.browser is None:
+            self._create_browser()
+            return
+        try:
+            # 尝试访问浏览器属性，检查连接是否正常
+            self.browser.get_tabs()
+        except Exception as e:
+            logger.warning(f"检测到Chrome连接断开: {e}，重新创建实例")
+            self._quit_browser()
+            self._create_browser()
+    
+    def _quit_browser(self) -> None:
+        try:
+            self.browser.quit()
+        except Exception:
+            pass
+        self.browser = None  # pyright: ignore[reportAttributeAccessIssue]
+        for tab in self._idle:
+            self._tab_generations.pop(tab.tab_id, None)
+        self._idle = []
+    
+    def get_browser(self) -> ChromiumPage:
+        """获取浏览器主页面"""
+        with self._cond:
+            self._ensure_browser()
+            return self.browser
+    
+    @contextmanager
+    def tab(self) -> Iterator:
+        """借出一个标签页, 没有空闲标签页时等待; 任务出错的标签页不再复用"""
+        with self._cond:
+            while True:
+                # 等待重启的浏览器不再借出标签页
+                if self._restart_pending:
+                    self._cond.wait()
+                    continue
+                self._ensure_browser()
+                if self._idle:
+                    break
+                if self._in_use == 0:
+                    # 标签页都已丢失(新建失败), 重启浏览器
+                    self._quit_browser()
+                    continue
+                self._cond.wait()
+            tab = self._idle.pop()
+            self._in_use += 1
+        healthy = False
+        try:
+            yield tab
+            healthy = True
+        finally:
+            self._release(tab, healthy)
+    
+    def _release(self, tab, healthy: bool) -> None:
+        with self._cond:
+            self._in_use -= 1
+            if self._is_stale(tab):
+                # 借出期间浏览器已重建, 旧浏览器的标签页直接丢弃, 新浏览器已预热了自己的标签页
+                logger.info("丢弃旧浏览器的标签页")
+                self._tab_navigations.pop(tab.tab_id, None)
+                self._tab_generations.pop(tab.tab_id, None)
+            elif self.browser is not None:
+                if not healthy or self._tab_navigations.get(tab.tab_id, 0) >= self._settings("Chromium_Tab_Recycle"):
+                    logger.info("回收标签页")
+                    self._close_tab(tab)
+                    try:
+                        tab = self._new_tab()
+                    except Exception as e:
+                        logger.warning(f"新建标签页失败: {e}")
+                        tab = None
+                if tab is not None:
+                    self._idle.append(tab)
+                if self._browser_navigations >= self._settings("Chromium_Browser_Recycle"):
+                    self._restart_pending = True
+            if self._restart_pending and self._in_use == 0:
+                logger.info(f"浏览器已导航 {self._browser_navigations} 次, 重启浏览器")
+                self._quit_browser()
+                self._restart_pending = False
+            self._cond.notify_all()
+    
+    def navigate(self, tab, url: str) -> None:
+        """在借出的标签页中打开url, 计入导航次数, 受请求频率限制并占用所在主机的并发名额"""
+        request_limiter.wait("GET", url)
+        with concurrency_governor.slot(url):
+            tab.get(url)
+        with self._cond:
+            # 旧浏览器的标签页不计入新浏览器的导航次数
+            if not self._is_stale(tab):
+                self._tab_navigations[tab.tab_id] = self._tab_navigations.get(tab.tab_id, 0) + 1
+                self._browser_navigations += 1
+        if self.on_navigated is not None:
+            try:
+                self.on_navigated(tab, url)
+            except Exception as e:
+                logger.warning(f"导航回调出错: {e}")
+    
+    def run(self, url: str, work: Callable[[Any], T]) -> T:
+        """借出标签页打开url后执行work(tab)并返回其结果"""
+        with self.tab() as tab:
+            self.navigate(tab, url)
+            return work(tab)
+    
+    def close(self) -> None:
+        """关闭浏览器"""
+        with self._cond:
+            if self.browser is not None:
+                logger.info("关闭唯一的Chrome实例")
+                self._quit_browser()
 
 
 class ChromiumScraper:
@@ -79,44 +463,20 @@ class ChromiumScraper:
         Returns:
             下载链接字符串
         """
-        # 获取唯一的Chrome实例
-        main_page = scraper_manager.get_main_chromium_page()
-        
-        # 新建标签页
-        logger.info(f"新建标签页，获取下载链接: {video.url}")
-        new_tab = main_page.new_tab()
+        broker = scraper_manager.get_chromium_broker()
         
-        try:
-            # 在新标签页中访问网页
-            new_tab.get(video.url)
-
+        def extract_download_link(tab) -> str:
             logger.info("等待下载引导页面出现")
-            new_tab.wait.ele_displayed(f"#{HANIME1_ELEMENTS['DOWNLOAD_BUTTON']}", timeout=timeout)
-            download_guide_link: str = str(new_tab.ele(f"#{HANIME1_ELEMENTS['DOWNLOAD_BUTTON']}").attr("href"))
+            tab.wait.ele_displayed(f"#{HANIME1_ELEMENTS['DOWNLOAD_BUTTON']}", timeout=timeout)
+            download_guide_link: str = str(tab.ele(f"#{HANIME1_ELEMENTS['DOWNLOAD_BUTTON']}").attr("href"))
             
-            new_tab.get(download_guide_link)
+            broker.navigate(tab, download_guide_link)
             logger.info("等待下载链接出现")
-            new_tab.wait.ele_displayed(f".{HANIME1_ELEMENTS['DOWNLOAD_LINK']}", timeout=timeout)
-            download_link: str = str(new_tab.ele(f".{HANIME1_ELEMENTS['DOWNLOAD_LINK']}").attr("data-url"))
-            
-            # 获取标签页数量
-            tabs = main_page.get_tabs()
-            
-            # 如果标签页数量大于1，关闭当前标签页
-            if len(tabs) > 1:
-                logger.info("关闭标签页")
-                new_tab.close()
-            
-            return download_link
-        except Exception as e:
-            # 确保标签页被关闭
-            tabs = main_page.get_tabs()
-            if len(tabs) > 1:
-                try:
-                    new_tab.close()
-                except:
-                    pass
-            raise e
+            tab.wait.ele_displayed(f".{HANIME1_ELEMENTS['DOWNLOAD_LINK']}", timeout=timeout)
+            return str(tab.ele(f".{HANIME1_ELEMENTS['DOWNLOAD_LINK']}").attr("data-url"))
+        
+        logger.info(f"使用标签页获取下载链接: {video.url}")
+        return broker.run(video.url, extract_download_link)
 
  
 class ScraperManager:
@@ -138,46 +498,35 @@ class ScraperManager:
             logger.info("创建新的ScraperManager实例")
             self.cloud_scraper = CloudScraper()
             
-            # 初始化chromium_page为None，延迟创建
-            self.chromium_page: ChromiumPage = None  # pyright: ignore[reportAttributeAccessIssue]
+            # 浏览器在第一次使用时才启动
+            self.chromium_broker = Chromium_Broker()
             
             # 添加cloudscraper失败标志，简化命名
             self.cs_failed = False
+            # cloudscraper失败后定期用probe_url重新探测, 恢复后清除失败标志
+            self._probe_url: str = ""
+            self._next_probe: float = 0
+            self._probe_lock = threading.Lock()
+            # 最近一次交给cloudscraper的cf_clearance
+            self._clearance: str = ""
+            self.chromium_broker.on_navigated = self._handoff_cookies
+            # 主机 -> {"strategy": 访问方式, "url": 探测URL, "expires": 过期时间}
+            self._strategies: dict[str, dict] = {}
+            self._session_lock = threading.Lock()
+            self._load_session()
             self._initialized = True
     
     def get_cloud_scraper(self) -> CloudScraper:
         """获取CloudScraper实例"""
         return self.cloud_scraper
     
+    def get_chromium_broker(self) -> Chromium_Broker:
+        """获取Chromium标签页池"""
+        return self.chromium_broker
+    
     def get_main_chromium_page(self):
         """获取唯一的Chrome浏览器实例，添加了延迟初始化和连接检查"""
-        # 延迟初始化ChromiumPage
-        if self.chromium_page is None:
-            logger.info("初始化dissionpage")
-            co = ChromiumOptions().auto_port()
-            co.incognito(True)
-            self.chromium_page = ChromiumPage(co)
-            self.chromium_page.set.window.size(600, 300)
-        else:
-            # 检查ChromiumPage连接状态
-            try:
-                # 尝试访问浏览器属性，检查连接是否正常
-                self.chromium_page.get_tabs()
-            except Exception as e:
-                logger.warning(f"检测到Chrome连接断开: {e}，重新创建实例")
-                # 连接断开，重新创建ChromiumPage实例
-                try:
-                    # 先尝试关闭旧实例
-                    self.chromium_page.close()
-                except:
-                    pass
-                # 创建新实例
-                logger.info("重新初始化dissionpage")
-                co = ChromiumOptions().auto_port()
-                co.incognito(True)
-                self.chromium_page = ChromiumPage(co)
-                self.chromium_page.set.window.size(600, 300)
-        return self.chromium_page
+        return self.chromium_broker.get_browser()
     
     def create_chromium_scraper(self) -> ChromiumScraper:
         """创建一个新的ChromiumScraper实例"""
@@ -188,33 +537,140 @@ class ScraperManager:
         """获取ChromiumScraper实例（兼容旧代码）"""
         return self.create_chromium_scraper()
     
-    def set_cs_failed(self, failed: bool):
-        """设置cloudscraper失败标志"""
+    def set_cs_failed(self, failed: bool, url: str = ""):
+        """设置cloudscraper失败标志
+        
+        Args:
+            failed: 是否失败
+            url: 失败的URL, 之后探测它所在的站点
+        """
         self.cs_failed = failed
+        if failed:
+            if url:
+                self._probe_url = urljoin(url, "/")
+            self._next_probe = time.monotonic() + float(sm.settings.get("CS_Reprobe_Interval", DEFAULT_SETTINGS["CS_Reprobe_Interval"]))
+        if url or self._probe_url:
+            self._set_strategy(url or self._probe_url, STRATEGY_CHROMIUM if failed else STRATEGY_CLOUDSCRAPER)
+            self.save_session()
     
     def is_cs_failed(self) -> bool:
-        """检查cloudscraper是否失败"""
+        """检查cloudscraper是否失败, 失败一段时间后或拿到新的cf_clearance后会重新探测"""
+        if self.cs_failed and time.monotonic() >= self._next_probe:
+            self._probe_cloud_scraper()
         return self.cs_failed
     
-    def get_page_html(self, url: str) -> str:
-        """获取页面HTML，自动处理cloudscraper和dissionpage的切换逻辑
+    def _probe_cloud_scraper(self) -> None:
+        """用cloudscraper请求一次站点首页, 成功则恢复快速通道"""
+        # 已有线程在探测时不等待, 沿用当前状态
+        if not self._probe_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_probe = time.monotonic() + float(sm.settings.get("CS_Reprobe_Interval", DEFAULT_SETTINGS["CS_Reprobe_Interval"]))
+            url: str = self._probe_url or f"{sm.settings.get('Hanime1_Hostname', DEFAULT_SETTINGS['Hanime1_Hostname'])}/"
+            logger.info(f"重新探测cloudscraper: {url}")
+            response = self.cloud_scraper.get(url, timeout=10)
+            response.close()
+            if response.status_code < 400:
+                logger.info("cloudscraper恢复可用，切换回cloudscraper")
+                self.set_cs_failed(False, url)
+            else:
+                logger.info(f"cloudscraper仍返回{response.status_code}，继续使用dissionpage")
+        except Exception as e:
+            logger.warning(f"探测cloudscraper失败: {e}")
+        finally:
+            self._probe_lock.release()
+    
+    def _handoff_cookies(self, tab, url: str) -> None:
+        """浏览器通过挑战后, 把cf_clearance等cookie和User-Agent交给cloudscraper并尽快重新探测"""
+        cookies: list[dict] = list(tab.cookies(all_info=True))
+        clearance: str = next((cookie["value"] for cookie in cookies if cookie.get("name") == "cf_clearance"), "")
+        if not clearance or clearance == self._clearance:
+            return
+        self._clearance = clearance
+        self.cloud_scraper.import_browser_session(cookies, tab.user_agent)
+        logger.info(f"已把浏览器的cf_clearance和{len(cookies)}个cookie交给cloudscraper")
+        self.save_session()
+        if self.cs_failed:
+            self._next_probe = 0
+    
+    def _set_strategy(self, url: str, strategy: str) -> None:
+        """记录主机的访问方式"""
+        with self._session_lock:
+            self._strategies[urlparse(url).netloc] = {
+                "strategy": strategy,
+                "url": urljoin(url, "/"),
+                "expires": time.time() + SESSION_STRATEGY_TTL,
+            }
+    
+    def _load_session(self) -> None:
+        """恢复上次保存的cookie、User-Agent和各主机的访问方式, 启动后第一次请求就不必重新过挑战"""
+        try:
+            with open(SESSION_FILE, 'r', encoding='utf-8') as f:
+                data: dict = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f"读取会话文件失败: {e}")
+            return
+        
+        now: float = time.time()
+        cookies: list[dict] = [cookie for cookie in data.get("cookies", [])
+                               if not cookie.get("expires") or cookie["expires"] > now]
+        self.cloud_scraper.import_browser_session(cookies, data.get("user_agent", ""))
+        self._clearance = next((cookie["value"] for cookie in cookies if cookie["name"] == "cf_clearance"), "")
+        self._strategies = {host: entry for host, entry in data.get("strategies", {}).items()
+                            if entry.get("expires", 0) > now}
+        logger.info(f"恢复了{len(cookies)}个cookie和{len(self._strategies)}个主机的访问方式")
+        
+        for entry in self._strategies.values():
+            if entry.get("strategy") != STRATEGY_CHROMIUM:
+                continue
+            # 上次需要浏览器: 直接走浏览器; 有cf_clearance时先探测一次cloudscraper
+            self.cs_failed = True
+            self._probe_url = entry.get("url", "")
+            if not self._clearance:
+                self._next_probe = time.monotonic() + float(sm.settings.get("CS_Reprobe_Interval", DEFAULT_SETTINGS["CS_Reprobe_Interval"]))
+            logger.info(f"{self._probe_url} 上次需要浏览器访问")
+            break
+    
+    def save_session(self) -> None:
+        """保存cookie、User-Agent和各主机的访问方式"""
+        cookies, user_agent = self.cloud_scraper.export_session()
+        with self._session_lock:
+            data: dict = {
+                "user_agent": user_agent,
+                "cookies": cookies,
+                "strategies": dict(self._strategies),
+            }
+            # 先写临时文件再替换, 避免中途退出留下半个会话文件
+            tmp_path = f"{SESSION_FILE}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=4, ensure_ascii=False)
+                os.replace(tmp_path, SESSION_FILE)
+            except Exception as e:
+                logger.error(f"保存会话文件失败: {e}")
+    
+    def get_page(self, url: str, headers: Optional[dict] = None) -> tuple[int, str, Any]:
+        """获取页面，自动处理cloudscraper和dissionpage的切换逻辑
         
         Args:
             url: 要获取的页面URL
+            headers: 附加的请求头(如条件请求头), 只在cloudscraper通道生效
             
         Returns:
-            页面的HTML内容
+            (状态码, HTML, 响应头); 条件请求命中时状态码为304、HTML为空; dissionpage获取的页面没有响应头
         """
-        if not self.cs_failed:
+        if not self.is_cs_failed():
             try:
                 logger.info(f"尝试使用cloudscraper获取页面: {url}")
-                response = self.cloud_scraper.get_response(url, timeout=10)
+                response = self.cloud_scraper.get(url, headers=headers, timeout=10)
                 if response.status_code == 403:
                     logger.warning("cloudscraper返回403，切换到dissionpage")
-                    self.cs_failed = True
+                    self.set_cs_failed(True, url)
                 else:
                     response.raise_for_status()
-                    return response.text
+                    return response.status_code, response.text, response.headers
             except Exception as e:
                 logger.warning(f"cloudscraper获取页面失败: {e}")
                 # 非403错误，继续使用cloudscraper，不切换
@@ -222,42 +678,35 @@ class ScraperManager:
         
         # 使用dissionpage获取HTML
         logger.info(f"使用dissionpage获取页面: {url}")
-        main_page = self.get_main_chromium_page()
-        
-        # 新建标签页
-        new_tab = main_page.new_tab()
         
-        try:
-            # 在新标签页中访问网页
-            new_tab.get(url)
-            
+        def read_html(tab) -> str:
             # 等待页面加载完成
-            new_tab.wait.ele_displayed(f".{HANIME1_ELEMENTS['SEARCH_RESULTS']}", timeout=10)
+            tab.wait.ele_displayed(f".{HANIME1_ELEMENTS['SEARCH_RESULTS']}", timeout=10)
+            return tab.html
+        
+        return 200, self.chromium_broker.run(url, read_html), {}
+    
+    def get_page_html(self, url: str) -> str:
+        """获取页面HTML，自动处理cloudscraper和dissionpage的切换逻辑
+        
+        Args:
+            url: 要获取的页面URL
             
-            # 获取页面HTML
-            html = new_tab.html
-            return html
-        finally:
-            # 确保标签页被关闭
-            tabs = main_page.get_tabs()
-            if len(tabs) > 1:
-                logger.info("关闭标签页")
-                try:
-                    new_tab.close()
-                except:
-                    pass
+        Returns:
+            页面的HTML内容
+        """
+        return self.get_page(url)[1]
     
     def close(self):
         """关闭所有爬虫实例"""
         logger.info("关闭所有爬虫实例")
+        # cloudscraper过挑战时也会更新cookie, 退出前再保存一次
+        self.save_session()
         # 关闭唯一的Chrome实例
-        if hasattr(self, 'chromium_page') and self.chromium_page is not None:
-            try:
-                logger.info("关闭唯一的Chrome实例")
-                self.chromium_page.close()
-            except Exception as e:
-                logger.warning(f"关闭Chrome实例失败: {e}")
-
+        try:
+            self.chromium_broker.close()
+        except Exception as e:
+            logger.warning(f"关闭Chrome实例失败: {e}")
 
 # 创建全局爬虫管理器实例
 scraper_manager = ScraperManager()
@@ -0,0 +1,164 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from ..config.Init_Settings import *
+from ..config.Settings_Manager import sm
+from ..utils.Logger import get_logger
+from ..utils.Retry_Engine import CONGESTION_ERRORS, classify_error, is_challenge_response
+
+logger: logging.Logger = get_logger("并发控制")
+
+
+def is_congestion_error(error: BaseException) -> bool:
+    """判断异常是否说明主机已过载(超时、连接失败、5xx、限流或Cloudflare挑战)"""
+    return classify_error(error) in CONGESTION_ERRORS
+
+
+class Host_Governor:
+    """单个主机的AIMD并发控制: 请求健康时缓慢增加并发上限, 遇到限流或超时时减半"""
+
+    def __init__(self, host: str, initial: int, maximum: int):
+        self.host = host
+        self.limit: float = float(initial)
+        self.maximum: int = maximum
+        self.in_flight: int = 0
+        self.last_decrease: float = 0
+        self.is_media_host: bool = False
+        self._cond = threading.Condition()
+
+    def mark_media_host(self, floor: int) -> None:
+        """标记为媒体主机, 第一次标记时把并发上限(及最大值)提高到至少floor"""
+        with self._cond:
+            if self.is_media_host:
+                return
+            self.is_media_host = True
+            self.maximum = max(self.maximum, floor)
+            if self.limit < floor:
+                self.limit = float(floor)
+                logger.debug(f"{self.host} 是媒体主机, 并发上限提高到 {floor}")
+            self._cond.notify_all()
+
+    def acquire(self) -> None:
+        """等待直到并发数低于上限"""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, success: bool, congested: bool, latency: float) -> None:
+        """释放并发名额并根据结果调整上限
+
+        Args:
+            success: 请求是否成功
+            congested: 是否遇到429/503/超时/Cloudflare挑战
+            latency: 收到响应头所用的秒数
+        """
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if congested:
+                # 同一批并发请求可能同时失败, 冷却期内只减半一次
+                if now - self.last_decrease >= GOVERNOR_DECREASE_COOLDOWN:
+                    self.limit = max(1.0, self.limit / 2)
+                    self.last_decrease = now
+                    logger.warning(f"{self.host} 出现限流或超时, 并发上限降为 {int(self.limit)}")
+            elif success and latency < GOVERNOR_LATENCY_THRESHOLD:
+                # 每成功一轮(约limit个请求)上限加1
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class Governor_Slot:
+    """一次请求占用的并发名额, 释放时把结果反馈给主机的并发控制"""
+
+    def __init__(self, governor: Host_Governor):
+        self.governor = governor
+        self.start_time: float = time.monotonic()
+        self.latency: Optional[float] = None
+        self.success: bool = True
+        self.congested: bool = False
+        self._released = False
+        self._lock = threading.Lock()
+
+    def record_response(self, response: requests.Response) -> None:
+        """记录响应状态和响应头到达的耗时"""
+        self.latency = time.monotonic() - self.start_time
+        if response.status_code in (429, 503) or is_challenge_response(response):
+            self.congested = True
+        if response.status_code >= 400:
+            self.success = False
+
+    def release(self, error: Optional[BaseException] = None) -> None:
+        """释放名额, 可重复调用"""
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        if error is not None:
+            self.success = False
+            self.congested = self.congested or is_congestion_error(error)
+        latency = self.latency if self.latency is not None else time.monotonic() - self.start_time
+        self.governor.release(self.success, self.congested, latency)
+
+
+class Concurrency_Governor:
+    """按主机管理并发上限, 下载和爬取的所有请求都通过这里获取名额"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._governors: dict[str, Host_Governor] = {}
+
+    def _get_governor(self, url: str) -> Host_Governor:
+        host: str = urlparse(url).netloc
+        with self._lock:
+            governor = self._governors.get(host)
+            if governor is None:
+                governor = Host_Governor(
+                    host,
+                    int(sm.settings.get("Host_Concurrency_Initial", DEFAULT_SETTINGS["Host_Concurrency_Initial"])),
+                    int(sm.settings.get("Host_Concurrency_Max", DEFAULT_SETTINGS["Host_Concurrency_Max"])),
+                )
+                self._governors[host] = governor
+            return governor
+
+    def mark_media_host(self, url: str) -> None:
+        """把url所在主机标记为媒体主机
+
+        媒体文件的流式响应要到传输结束才释放名额, 每个文件还会占用Download_Segments个连接, 完成得很慢,
+        加性增加几乎不起作用; 因此媒体主机的并发上限从Max_Threads×Download_Segments起步, 之后仍按AIMD调整
+        """
+        floor: int = (max(1, int(sm.settings.get("Max_Threads", DEFAULT_SETTINGS["Max_Threads"])))
+                      * max(1, int(sm.settings.get("Download_Segments", DEFAULT_SETTINGS["Download_Segments"]))))
+        self._get_governor(url).mark_media_host(floor)
+
+    def acquire(self, url: str) -> Governor_Slot:
+        """获取url所在主机的一个并发名额, 用完后必须调用release"""
+        governor = self._get_governor(url)
+        governor.acquire()
+        return Governor_Slot(governor)
+
+    @contextmanager
+    def slot(self, url: str) -> Iterator[Governor_Slot]:
+        """以上下文管理器的方式占用一个并发名额, 异常会被当作失败反馈"""
+        slot = self.acquire(url)
+        try:
+            yield slot
+        except BaseException as e:
+            slot.release(e)
+            raise
+        slot.release()
+
+    def get_limits(self) -> dict[str, int]:
+        """返回各主机当前的并发上限"""
+        with self._lock:
+            return {host: int(governor.limit) for host, governor in self._governors.items()}
+
+
+# 创建全局并发控制器
+concurrency_governor = Concurrency_Governor()
@@ -0,0 +1,116 @@
+import importlib.util
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, TypeVar
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from ..config.Init_Settings import *
+from ..config.Settings_Manager import sm
+from ..utils.Logger import get_logger
+
+logger: logging.Logger = get_logger("HTML解析")
+
+T = TypeVar("T")
+
+# BeautifulSoup的解析后端及其依赖的模块, 按速度从快到慢排列
+PARSER_BACKENDS: tuple = (
+    ("lxml", "lxml"),
+    ("html.parser", None),
+)
+
+
+def _select_backend() -> str:
+    """按Html_Parser设置选择解析后端, auto时使用已安装的最快后端, 指定的后端未安装时退回html.parser"""
+    preferred: str = sm.settings.get("Html_Parser", DEFAULT_SETTINGS["Html_Parser"])
+    for name, module in PARSER_BACKENDS:
+        if preferred not in ("auto", name):
+            continue
+        if module is None or importlib.util.find_spec(module) is not None:
+            return name
+    logger.warning(f"HTML解析后端 {preferred} 不可用, 使用html.parser")
+    return "html.parser"
+
+
+HTML_PARSER: str = _select_backend()
+logger.debug(f"HTML解析后端: {HTML_PARSER}")
+
+
+def has_class(name: str) -> Callable[[Any], bool]:
+    """生成SoupStrainer的class匹配函数
+
+    SoupStrainer在建树前匹配, 此时class属性还是完整的字符串, class_="a"只能匹配class恰好为"a"的元素;
+    用本函数匹配class中包含name的元素, 与select("div.name")的含义一致
+    """
+    def match(value: Any) -> bool:
+        if not value:
+            return False
+        return name in (value.split() if isinstance(value, str) else value)
+    return match
+
+
+def parse_html(html: str, only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+    """解析HTML
+
+    Args:
+        html: 页面HTML
+        only: 只为匹配的元素(及其子孙)建树, 其余部分只做词法扫描; 用select/find读取的节点
+            都在匹配范围内时结果与完整解析相同
+
+    Returns:
+        BeautifulSoup对象
+    """
+    return BeautifulSoup(html, HTML_PARSER, parse_only=only)
+
+
+class Parse_Pool:
+    """可选的HTML解析进程池
+
+    Parse_Processes大于0时把解析函数交给子进程执行, 传出原始HTML、传回普通字典, 由调用方构造对象,
+    大量页面的解析可以用上多个核心, 不和界面线程、下载线程争抢GIL; 为0时在当前线程直接执行。
+    解析函数必须定义在模块顶层
+    """
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        """延迟创建进程池, 未开启时返回None"""
+        processes: int = int(sm.settings.get("Parse_Processes", DEFAULT_SETTINGS["Parse_Processes"]))
+        if processes <= 0:
+            return None
+        with self._lock:
+            if self._executor is None:
+                logger.info(f"创建HTML解析进程池, 进程数: {processes}")
+                # 统一使用spawn, 避免在有多个线程时fork
+                self._executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def run(self, func: Callable[..., T], *args: Any) -> T:
+        """执行解析函数并返回结果, 进程池不可用时在当前线程执行"""
+        executor = self._get_executor()
+        if executor is None:
+            return func(*args)
+        try:
+            return executor.submit(func, *args).result()
+        except BrokenProcessPool as e:
+            logger.warning(f"解析进程池已失效, 改为在当前线程解析: {e}")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            return func(*args)
+
+    def close(self) -> None:
+        """关闭进程池"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# 创建全局解析进程池
+parse_pool = Parse_Pool()
@@ -0,0 +1,138 @@
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+from ..config.Init_Settings import *
+from ..config.Settings_Manager import sm
+from ..utils.Logger import get_logger
+
+logger: logging.Logger = get_logger("限速")
+
+
+class Token_Bucket:
+    """令牌桶, rate为每秒允许的字节数, 0表示不限速
+
+    令牌不足时允许先透支, 调用方按透支量睡眠, 多个线程同时消费时总速率仍不超过rate
+    """
+
+    def __init__(self, rate: float = 0):
+        self._lock = threading.Lock()
+        self.rate: float = 0
+        self.tokens: float = 0
+        self.last_time: float = time.monotonic()
+        self.set_rate(rate)
+
+    def set_rate(self, rate: float) -> None:
+        """调整速率, 正在下载的线程下一次消费时即按新速率计算"""
+        with self._lock:
+            self.rate = max(0.0, float(rate))
+            # 最多允许1秒的突发
+            self.tokens = min(self.tokens, self.rate)
+            self.last_time = time.monotonic()
+
+    def consume(self, amount: int) -> None:
+        """消费amount个令牌, 不足时阻塞到令牌足够"""
+        with self._lock:
+            if self.rate <= 0:
+                return
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.last_time) * self.rate)
+            self.last_time = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class Bandwidth_Limiter:
+    """下载带宽限制器, 包含一个全局令牌桶和每个渠道各自的令牌桶, 所有下载线程共享"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._global_bucket = Token_Bucket()
+        self._channel_buckets: dict[str, Token_Bucket] = {}
+        self.reload()
+
+    def reload(self) -> None:
+        """从设置中重新读取限速, 修改设置后调用即可生效, 不需要重启下载线程"""
+        global_limit: float = float(sm.settings.get("Bandwidth_Limit", DEFAULT_SETTINGS["Bandwidth_Limit"]))
+        channel_limits: dict = sm.settings.get("Channel_Bandwidth_Limit", DEFAULT_SETTINGS["Channel_Bandwidth_Limit"])
+        self._global_bucket.set_rate(global_limit * 1024)
+        with self._lock:
+            for channel_name, limit in channel_limits.items():
+                self._get_bucket(channel_name).set_rate(float(limit) * 1024)
+        logger.info(f"全局限速: {global_limit or '不限'} KB/s, 渠道限速: {channel_limits}")
+
+    def _get_bucket(self, channel_name: str) -> Token_Bucket:
+        bucket = self._channel_buckets.get(channel_name)
+        if bucket is None:
+            bucket = Token_Bucket()
+            self._channel_buckets[channel_name] = bucket
+        return bucket
+
+    def throttle(self, channel_name: str, amount: int) -> None:
+        """报告收到了amount字节, 超出限速时阻塞当前线程
+
+        Args:
+            channel_name: 渠道名称, 为空时只受全局限速
+            amount: 本次收到的字节数
+        """
+        if channel_name:
+            with self._lock:
+                bucket = self._get_bucket(channel_name)
+            bucket.consume(amount)
+        self._global_bucket.consume(amount)
+
+
+class Request_Limiter:
+    """请求频率限制器, 按Request_Rate_Rules中的规则对每个主机分别限速
+
+    使用GCRA算法: 每条规则和主机只记录下一次请求的理论到达时间, 请求到来时先预约位置再睡眠到预约的
+    时刻, 不需要轮询; 多个线程同时等待时按到达顺序依次放行
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (规则序号, 主机) -> 理论到达时间
+        self._arrivals: dict[tuple[int, str], float] = {}
+
+    @staticmethod
+    def _match(rule: dict, method: str, path: str) -> bool:
+        if rule.get("method") and rule["method"].upper() != method.upper():
+            return False
+        return not rule.get("path") or path.startswith(rule["path"])
+
+    def wait(self, method: str, url: str) -> None:
+        """按匹配的规则阻塞到允许发送请求
+
+        Args:
+            method: 请求方法
+            url: 请求URL
+        """
+        rules: list[dict] = sm.settings.get("Request_Rate_Rules", DEFAULT_SETTINGS["Request_Rate_Rules"])
+        parsed = urlparse(url)
+        delay: float = 0.0
+        with self._lock:
+            now = time.monotonic()
+            for index, rule in enumerate(rules):
+                if not self._match(rule, method, parsed.path):
+                    continue
+                interval: float = float(rule.get("interval", 0))
+                if interval <= 0:
+                    continue
+                key = (index, parsed.netloc)
+                arrival = max(self._arrivals.get(key, now), now)
+                # 允许提前(burst - 1)个间隔到达
+                allowed_at = arrival - interval * (max(1, int(rule.get("burst", 1))) - 1)
+                delay = max(delay, allowed_at - now)
+                self._arrivals[key] = arrival + interval
+        if delay > 0:
+            logger.info(f"{method} {url} 受请求频率限制, 等待 {delay:.2f} 秒")
+            time.sleep(delay)
+
+
+# 创建全局带宽限制器
+bandwidth_limiter = Bandwidth_Limiter()
+# 创建全局请求频率限制器
+request_limiter = Request_Limiter()
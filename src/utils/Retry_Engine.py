@@ -0,0 +1,128 @@
+import random
+import threading
+from typing import Optional
+
+import cloudscraper
+import requests
+import urllib3
+
+from ..config.Init_Settings import *
+
+# 错误分类
+ERROR_TRANSIENT: str = "transient"  # 超时、连接中断、5xx等, 稍后重试大概率成功
+ERROR_RATE_LIMITED: str = "rate_limited"  # 429, 需要退避更久再重试
+ERROR_CHALLENGE: str = "challenge"  # Cloudflare挑战, 重试没有意义, 需要换浏览器
+ERROR_PERMANENT: str = "permanent"  # 404、解析失败、磁盘错误等, 重试也不会成功
+ERROR_EXPIRED_LINK: str = "expired_link"  # 缓存的媒体链接已失效, 重新解析后重试
+
+RETRYABLE_ERRORS: tuple = (ERROR_TRANSIENT, ERROR_RATE_LIMITED, ERROR_EXPIRED_LINK)
+RETRYABLE_STATUS: tuple = (408, 429, 500, 502, 503, 504)
+# 说明主机已过载的错误, 并发控制据此减半并发上限
+CONGESTION_ERRORS: tuple = (ERROR_TRANSIENT, ERROR_RATE_LIMITED, ERROR_CHALLENGE)
+
+
+class Transfer_Error(IOError):
+    """传输中途出错(数据不完整、分段响应不符合预期), 可以重试"""
+
+
+class Expired_Link_Error(Exception):
+    """缓存的签名链接返回403/410, 需要重新解析"""
+
+
+def is_challenge_response(response: requests.Response) -> bool:
+    """判断响应是否为Cloudflare挑战页"""
+    if response.status_code not in (403, 503):
+        return False
+    return "cf-mitigated" in response.headers or response.headers.get("Server", "").lower() == "cloudflare"
+
+
+def classify_status(response: requests.Response) -> str:
+    """根据HTTP状态码分类"""
+    status: int = response.status_code
+    if is_challenge_response(response):
+        return ERROR_CHALLENGE
+    if status == 429:
+        return ERROR_RATE_LIMITED
+    if status in RETRYABLE_STATUS:
+        return ERROR_TRANSIENT
+    return ERROR_PERMANENT
+
+
+def classify_error(error: BaseException) -> str:
+    """把异常分类为 transient / rate_limited / challenge / permanent"""
+    if isinstance(error, Expired_Link_Error):
+        return ERROR_EXPIRED_LINK
+    if isinstance(error, cloudscraper.exceptions.CloudflareChallengeError):
+        return ERROR_CHALLENGE
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return classify_status(error.response)
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError,
+                          requests.exceptions.ChunkedEncodingError, urllib3.exceptions.HTTPError,
+                          Transfer_Error, TimeoutError, ConnectionError)):
+        return ERROR_TRANSIENT
+    # yt_dlp等把HTTP错误包装成普通异常, 只能从消息判断
+    message: str = str(error)
+    if "HTTP Error 429" in message:
+        return ERROR_RATE_LIMITED
+    if any(keyword in message for keyword in ("HTTP Error 5", "timed out", "Connection reset", "IncompleteRead")):
+        return ERROR_TRANSIENT
+    return ERROR_PERMANENT
+
+
+class Retry_Policy:
+    """指数退避加随机抖动的重试策略"""
+
+    def __init__(self, base_delay: float = RETRY_BASE_DELAY, max_delay: float = RETRY_MAX_DELAY):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def get_delay(self, attempt: int, error_class: str, retry_after: Optional[float] = None) -> float:
+        """计算第attempt次重试前等待的秒数(full jitter)
+
+        Args:
+            attempt: 已失败的次数, 从1开始
+            error_class: 错误分类, 被限流时退避时间翻4倍
+            retry_after: 服务器给出的Retry-After秒数
+        """
+        base = self.base_delay * (4 if error_class == ERROR_RATE_LIMITED else 1)
+        delay = random.uniform(0, min(self.max_delay, base * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+
+def is_link_rejected(error: BaseException) -> bool:
+    """判断媒体链接是否被拒绝(403/410), 签名链接过期时通常如此"""
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code in (403, 410) and not is_challenge_response(error.response)
+    # yt_dlp把HTTP错误包装成普通异常
+    message: str = str(error)
+    return "HTTP Error 403" in message or "HTTP Error 410" in message
+
+
+def parse_retry_after(response: requests.Response) -> Optional[float]:
+    """读取Retry-After响应头(只支持秒数)"""
+    value: str = response.headers.get("Retry-After", "")
+    return float(value) if value.strip().isdigit() else None
+
+
+# 当前线程最近一次失败的分类, 下载方法只返回bool, 下载线程通过它取得失败原因
+_failure_local = threading.local()
+
+
+def record_failure(error: BaseException) -> str:
+    """记录当前线程的失败原因并返回分类"""
+    error_class = classify_error(error)
+    _failure_local.error_class = error_class
+    return error_class
+
+
+def pop_failure() -> Optional[str]:
+    """取出并清空当前线程记录的失败分类"""
+    error_class: Optional[str] = getattr(_failure_local, "error_class", None)
+    _failure_local.error_class = None
+    return error_class
+
+
+# 创建全局重试策略
+retry_policy = Retry_Policy()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+直链下载基准测试
+
+在本地启动支持Range的HTTP服务器, 提供一个生成的MP4文件, 分别用自己的HTTP下载器(Http_Downloader)
+和yt_dlp("bestvideo+bestaudio/best", 即原来的下载方式)下载, 比较墙钟时间和本进程的CPU时间。
+服务器运行在单独的进程中, 不计入CPU时间; --conn-rate可以限制每个连接的速度, 模拟按连接限速的CDN。
+
+用法:
+    python tools/bench_direct_download.py [--size-mb 64] [--runs 3] [--conn-rate 0]
+"""
+
+import argparse
+import hashlib
+import http.server
+import multiprocessing
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, 'src'))
+
+
+def make_mp4(path: str, size: int) -> None:
+    """生成只有ftyp、moov、mdat三个顶层box的MP4文件, 能通过下载器的内容校验"""
+    ftyp = (16).to_bytes(4, "big") + b"ftypisom" + b"\x00\x00\x02\x00"
+    moov = (8).to_bytes(4, "big") + b"moov"
+    mdat_size = size - len(ftyp) - len(moov)
+    with open(path, "wb") as f:
+        f.write(ftyp + moov + mdat_size.to_bytes(4, "big") + b"mdat")
+        remaining = mdat_size - 8
+        block = os.urandom(1024 * 1024)
+        while remaining > 0:
+            f.write(block[:remaining])
+            remaining -= len(block)
+
+
+class Range_Handler(http.server.BaseHTTPRequestHandler):
+    """只提供一个文件的HTTP处理器, 支持HEAD和单区间Range请求, 返回强ETag"""
+
+    protocol_version = "HTTP/1.1"
+    file_path: str = ""
+    # 每个连接每秒最多发送的字节数, 0表示不限
+    conn_rate: int = 0
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_HEAD(self) -> None:
+        self._send(head_only=True)
+
+    def do_GET(self) -> None:
+        self._send(head_only=False)
+
+    def _send(self, head_only: bool) -> None:
+        size = os.path.getsize(self.file_path)
+        start, end = 0, size - 1
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", f'"{size:x}"')
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if head_only:
+            return
+        try:
+            with open(self.file_path, "rb") as f:
+                f.seek(start)
+                remaining = end - start + 1
+                sent, begin = 0, time.monotonic()
+                while remaining > 0:
+                    data = f.read(min(remaining, 256 * 1024))
+                    if not data:
+                        break
+                    self.wfile.write(data)
+                    remaining -= len(data)
+                    sent += len(data)
+                    if self.conn_rate:
+                        delay = sent / self.conn_rate - (time.monotonic() - begin)
+                        if delay > 0:
+                            time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def serve(file_path: str, conn_rate: int, port_queue) -> None:
+    """在子进程中运行HTTP服务器, 通过队列返回端口"""
+    Range_Handler.file_path = file_path
+    Range_Handler.conn_rate = conn_rate
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Range_Handler)
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def measure(download, save_path: str) -> tuple[float, float]:
+    """执行一次下载, 返回(墙钟秒数, CPU秒数)"""
+    if os.path.exists(save_path):
+        os.remove(save_path)
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    download(save_path)
+    return time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="比较直链下载器与yt_dlp下载同一个本地MP4文件的耗时")
+    parser.add_argument("--size-mb", type=int, default=64, help="测试文件大小(MB)")
+    parser.add_argument("--runs", type=int, default=3, help="每种方式下载的次数")
+    parser.add_argument("--conn-rate", type=float, default=0, help="服务器每个连接的限速(MB/s), 0表示不限")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="iwtn_bench_")
+    # 设置、缓存等文件写在当前目录, 切换到临时目录避免污染项目目录
+    os.chdir(work_dir)
+    source_path = os.path.join(work_dir, "source.mp4")
+    make_mp4(source_path, args.size_mb * 1024 * 1024)
+    source_digest = file_digest(source_path)
+
+    context = multiprocessing.get_context("spawn")
+    port_queue = context.Queue()
+    server = context.Process(target=serve, args=(source_path, int(args.conn_rate * 1024 * 1024), port_queue),
+                             daemon=True)
+    server.start()
+    url = f"http://127.0.0.1:{port_queue.get(timeout=30)}/video.mp4"
+
+    from src.config.Init_Settings import DEFAULT_HEADERS
+    from src.core.Disk_Writer import disk_writer
+    from src.core.Http_Downloader import Http_Downloader
+    from src.core.YoutubeDL_Pool import ytdl_pool
+
+    ydl_opts: dict = {
+        "format": "bestvideo+bestaudio/best",
+        "quiet": True,
+        "no_warnings": True,
+        "noprogress": True,
+    }
+
+    def direct(save_path: str) -> None:
+        Http_Downloader.download(url, save_path, DEFAULT_HEADERS.copy(), "bench")
+
+    def ytdl(save_path: str) -> None:
+        info = ytdl_pool.extract_info(ydl_opts, url)
+        ytdl_pool.download(ydl_opts, save_path, info)
+
+    results: dict[str, list[tuple[float, float]]] = {"http": [], "yt_dlp": []}
+    try:
+        for _ in range(args.runs):
+            for name, download in (("http", direct), ("yt_dlp", ytdl)):
+                save_path = os.path.join(work_dir, f"{name}.mp4")
+                results[name].append(measure(download, save_path))
+                if file_digest(save_path) != source_digest:
+                    raise RuntimeError(f"{name} 下载的文件与源文件不一致")
+    finally:
+        ytdl_pool.close()
+        disk_writer.close()
+        server.terminate()
+
+    rate = f"每连接 {args.conn_rate} MB/s" if args.conn_rate else "不限速"
+    print(f"\n文件大小: {args.size_mb} MB, 服务器{rate}, 每种方式 {args.runs} 次, 取中位数")
+    print(f"{'方式':<8}{'墙钟(s)':>10}{'CPU(s)':>10}{'MB/s':>10}")
+    for name, samples in results.items():
+        wall = statistics.median(sample[0] for sample in samples)
+        cpu = statistics.median(sample[1] for sample in samples)
+        print(f"{name:<8}{wall:>10.3f}{cpu:>10.3f}{args.size_mb / wall:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
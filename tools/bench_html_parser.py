@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTML解析基准测试
+
+以html.parser完整解析后的提取结果为基准, 检查各可用解析后端配合SoupStrainer局部解析时提取结果是否一致,
+并比较解析耗时。网站改版后用保存下来的页面重新运行, 确认局部解析仍然提取到同样的数据。
+
+页面类型:
+    xpv-search      Xpv搜索结果页
+    hanime1-search  Hanime1搜索结果页
+    xpv-video       Xpv视频页(JSON-LD)
+    hanime1-video   Hanime1视频页(video-details-wrapper)
+
+用法:
+    python tools/bench_html_parser.py [--page 类型=文件 ...] [--repeat 20]
+
+不指定--page时使用生成的示例页面; 指定时只测试给出的页面
+"""
+
+import argparse
+import importlib.util
+import os
+import re
+import sys
+import tempfile
+import time
+from typing import Any, Callable
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+ROOT_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, 'src'))
+
+SEARCH_URL: str = "https://example.com/search?page=1"
+
+
+def sample_pages() -> dict[str, str]:
+    """生成与网站结构相同的示例页面, 每页带有大量与结果无关的元素"""
+    from src.core.Search_Engine import XPV_RESULT_CLASS
+
+    noise = "".join(
+        f"<div class='nav-item row'><a href='/c/{i}'>分类{i}</a><span>说明{i}</span><ul><li>a</li><li>b</li></ul></div>"
+        for i in range(600)
+    )
+    scripts = "".join(f"<script>var x{i} = {i};</script>" for i in range(20))
+
+    xpv_cards = "".join(
+        f"<div class='{XPV_RESULT_CLASS}'><div class='thumb'>"
+        f"<a href='/v/{i}.html' title='[作者{i % 7}] 标题{i}'>"
+        f"<img src='/loading.gif' data-src='https://img.example.com/titlep/2025/11{i % 28 + 1:02d}/{i}.jpg'></a>"
+        f"</div><p class='info'>{i}次观看</p></div>"
+        for i in range(60)
+    )
+    hanime1_cards = "".join(
+        f"<div class='col-xs-6 video-item-container' title='[作者{i % 7}] 标题{i}'>"
+        f"<a class='overlay' href='https://hanime1.me/watch?v={i}'><img src='/t/{i}.jpg'></a>"
+        f"<div class='card-mobile-title'>标题{i}</div></div>"
+        for i in range(60)
+    )
+    json_ld = ('<script type="application/ld+json">{"@context": "https://schema.org", "@type": "VideoObject", '
+               '"name": "标题", "contentUrl": "https://cdn.example.com/v/1.mp4"}</script>')
+    details = ("<div class='video-details-wrapper hidden-xs'><div class='video-description-panel'>"
+               "<span>观看次数：1万次</span> <span>2025-11-07</span></div></div>")
+
+    def page(body: str, head: str = "") -> str:
+        return f"<!DOCTYPE html><html><head>{head}<title>t</title>{scripts}</head><body>{noise}{body}{noise}</body></html>"
+
+    return {
+        "xpv-search": page(f"<div class='row'>{xpv_cards}</div>"),
+        "hanime1-search": page(f"<div class='row'>{hanime1_cards}</div>"),
+        "xpv-video": f"<!DOCTYPE html><html><head>{json_ld}{scripts}</head><body>{noise}</body></html>",
+        "hanime1-video": page(details),
+    }
+
+
+# 基准: html.parser完整解析, 提取逻辑与改用局部解析之前相同
+def reference_xpv_search(html: str) -> Any:
+    from src.core.Search_Engine import XPV_RESULT_CLASS
+
+    soup = BeautifulSoup(html, "html.parser")
+    cards = soup.find_all("div", class_=XPV_RESULT_CLASS)
+    results: list[dict] = []
+    for div in cards:
+        a_tag = div.find("a", href=True)
+        if not a_tag:
+            continue
+        title = str(a_tag.get("title", ""))
+        author = re.search(r"\[(.*?)\]", title)
+        img_tag = a_tag.find("img", src=True)
+        match = re.search(r"/(\d{4})/(\d{2})(\d{2})/", str(img_tag["data-src"])) if img_tag else None
+        results.append({"title": title, "url": str(a_tag["href"]), "author": author.group(1) if author else "unknown",
+                        "furl": SEARCH_URL, "updatedAt": "-".join(match.groups()) if match else ""})
+    return len(cards), results
+
+
+def reference_hanime1_search(html: str) -> Any:
+    soup = BeautifulSoup(html, "html.parser")
+    cards = soup.select("div.video-item-container")
+    results: list[dict] = []
+    for div in cards:
+        title = str(div.get("title", ""))
+        author = re.search(r"\[(.*?)\]", title)
+        a_tag = div.select_one("a[href]")
+        if a_tag and a_tag.has_attr("href"):
+            results.append({"title": title, "url": str(a_tag["href"]),
+                            "author": author.group(1) if author else "unknown", "furl": SEARCH_URL})
+    return len(cards), results
+
+
+def reference_xpv_video(html: str) -> Any:
+    script_tag = BeautifulSoup(html, "html.parser").find("script")
+    return script_tag.string if script_tag else None
+
+
+def reference_hanime1_video(html: str) -> Any:
+    div_info = BeautifulSoup(html, "html.parser").select_one("div.video-details-wrapper")
+    return div_info.text if div_info else None
+
+
+# 当前代码的提取方式: 所选后端加SoupStrainer
+def current_xpv_search(html: str) -> Any:
+    from src.core.Search_Engine import parse_xpv_result_cards
+    return parse_xpv_result_cards(html, SEARCH_URL)
+
+
+def current_hanime1_search(html: str) -> Any:
+    from src.core.Search_Engine import parse_hanime1_result_cards
+    return parse_hanime1_result_cards(html, SEARCH_URL)
+
+
+def current_xpv_video(html: str) -> Any:
+    from src.utils.Html_Parser import parse_html
+    script_tag = parse_html(html, SoupStrainer("script")).find("script")
+    return script_tag.string if script_tag else None
+
+
+def current_hanime1_video(html: str) -> Any:
+    from src.utils.Html_Parser import has_class, parse_html
+    div_info = parse_html(html, SoupStrainer("div", class_=has_class("video-details-wrapper"))).select_one(
+        "div.video-details-wrapper")
+    return div_info.text if div_info else None
+
+
+EXTRACTORS: dict[str, tuple[Callable[[str], Any], Callable[[str], Any]]] = {
+    "xpv-search": (reference_xpv_search, current_xpv_search),
+    "hanime1-search": (reference_hanime1_search, current_hanime1_search),
+    "xpv-video": (reference_xpv_video, current_xpv_video),
+    "hanime1-video": (reference_hanime1_video, current_hanime1_video),
+}
+
+
+def timed(func: Callable[[str], Any], html: str, repeat: int) -> tuple[Any, float]:
+    """返回结果和每次调用的平均毫秒数"""
+    result = func(html)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(html)
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="检查局部解析与完整解析的提取结果是否一致并比较耗时")
+    parser.add_argument("--page", action="append", default=[], metavar="类型=文件",
+                        help=f"保存的页面, 类型为 {', '.join(EXTRACTORS)} 之一, 可以重复指定")
+    parser.add_argument("--repeat", type=int, default=20, help="每种方式解析的次数")
+    args = parser.parse_args()
+
+    pages: list[tuple[str, str, str]] = []
+    for item in args.page:
+        kind, _, path = item.partition("=")
+        if kind not in EXTRACTORS or not path:
+            parser.error(f"无效的页面参数: {item}")
+        with open(path, "r", encoding="utf-8") as f:
+            pages.append((kind, os.path.basename(path), f.read()))
+
+    # 设置、缓存等文件写在当前目录, 切换到临时目录避免污染项目目录
+    os.chdir(tempfile.mkdtemp(prefix="iwtn_bench_"))
+    from src.utils import Html_Parser
+
+    if not pages:
+        pages = [(kind, "示例页面", html) for kind, html in sample_pages().items()]
+    backends: list[str] = [name for name, module in Html_Parser.PARSER_BACKENDS
+                           if module is None or importlib.util.find_spec(module) is not None]
+
+    mismatches: int = 0
+    print(f"{'页面':<28}{'方式':<26}{'耗时(ms)':>10}  结果")
+    for kind, name, html in pages:
+        reference, current = EXTRACTORS[kind]
+        expected, reference_ms = timed(reference, html, args.repeat)
+        print(f"{kind + ' ' + name:<28}{'html.parser 完整解析':<26}{reference_ms:>10.2f}  基准")
+        for backend in backends:
+            # parse_html在调用时读取HTML_PARSER, 临时切换即可测试各后端
+            Html_Parser.HTML_PARSER = backend
+            result, current_ms = timed(current, html, args.repeat)
+            same = result == expected
+            mismatches += not same
+            print(f"{'':<28}{backend + ' 局部解析':<26}{current_ms:>10.2f}  "
+                  f"{'一致' if same else '不一致'} ({reference_ms / current_ms:.1f}x)")
+        if expected in (None, (0, [])):
+            print(f"{'':<28}警告: 基准没有提取到任何内容, 页面类型可能不对")
+
+    print(f"\n可用后端: {', '.join(backends)}; {'全部一致' if not mismatches else f'{mismatches} 项不一致'}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())